@@ -1,35 +1,80 @@
 import os
-import fitz  # PyMuPDF
+import time
+import numpy as np
 import networkx as nx
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from sentence_transformers import SentenceTransformer, util
 import shutil
-from collections import Counter
+from functools import lru_cache
+from pdf_store import extract_publication_year, file_hash, get_pdf_store
+from vector_index import VectorIndex
+from kg_store import KG_STORE_FOLDER, KnowledgeGraphStore
+from keyword_engine import NLTK_RESOURCES, KeywordEngine, nltk_resource_available
+from paper_graph import PaperGraph
+from lexical_index import InvertedIndex
+from chunk_index import CHUNK_OVERLAP, CHUNK_SIZE, ChunkIndex
 
-# Download necessary NLTK resources
-nltk.download("punkt")
-nltk.download("stopwords")
+# Sentence embedding model; embeddings saved by another model are recomputed
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Identifies how saved embeddings were produced; stores written with other settings are recomputed
+EMBEDDING_STORE_KEY = f"{EMBEDDING_MODEL}/chunks-{CHUNK_SIZE}-{CHUNK_OVERLAP}"
+# Number of chunks encoded per model call in build_graph
+EMBEDDING_BATCH_SIZE = 32
+# Corpus-level keyword weighting: "tfidf" or "bm25"
+KEYWORD_WEIGHTING = "tfidf"
+# Similarity edges per paper in the paper graph, and the minimum cosine score for an edge
+SIMILARITY_NEIGHBOURS = 10
+MIN_EDGE_SIMILARITY = 0.3
+# Reciprocal rank fusion constant (Cormack et al.) and default signal weights for weighted fusion
+RRF_K = 60
+SEARCH_WEIGHTS = {"bm25": 0.4, "embedding": 0.5, "graph": 0.1}
+
+@lru_cache(maxsize=None)
+def get_sentence_model(model_name=EMBEDDING_MODEL):
+    """Loads a SentenceTransformer on first use and shares it across the process."""
+    from sentence_transformers import SentenceTransformer  # Heavy import (torch): only paid when embedding
+
+    return SentenceTransformer(model_name)
+
+def check_offline_resources(model_name=EMBEDDING_MODEL):
+    """Reports which heavy resources are available locally, without touching the network."""
+    status = {resource: nltk_resource_available(path) for path, resource in NLTK_RESOURCES}
+    try:
+        from huggingface_hub import try_to_load_from_cache
+
+        cached = try_to_load_from_cache(f"sentence-transformers/{model_name}", "config.json")
+        status[model_name] = isinstance(cached, str)
+    except ImportError:
+        status[model_name] = False
+    return status
 
 class KnowledgeGraph:
-    def __init__(self, pdf_folder, related_papers_folder):
+    def __init__(self, pdf_folder, related_papers_folder, store_folder=KG_STORE_FOLDER,
+                 references_folder="./references_json"):
         self.pdf_folder = pdf_folder
         self.related_papers_folder = related_papers_folder
+        self.references_folder = references_folder
         os.makedirs(self.related_papers_folder, exist_ok=True)  # Ensure folder exists
 
-        # Initialize model and knowledge graph
-        self.bert_model = SentenceTransformer("all-MiniLM-L6-v2")
+        # Initialize knowledge graph; the embedding model is loaded on first use
         self.kg = nx.Graph()
         self.papers = {}
+        self.index = VectorIndex()
+        self.store = KnowledgeGraphStore(store_folder)
+        self.keyword_engine = KeywordEngine(KEYWORD_WEIGHTING)
+        self.keywords_path = os.path.join(store_folder, "keywords.npz")
+        self.paper_graph = PaperGraph([])
+        self.lexical_index = InvertedIndex(os.path.join(store_folder, "lexical.sqlite"))
+        self.chunk_index = ChunkIndex(store_folder)
+
+    @property
+    def bert_model(self):
+        return get_sentence_model(EMBEDDING_MODEL)
 
     def extract_text_from_pdf(self, pdf_path, char_limit=4000):
         """Extracts text from a PDF with an optional character limit."""
         try:
-            doc = fitz.open(pdf_path)
             text = ""
-            for page in doc:
-                text += page.get_text("text")
+            for page_text in get_pdf_store().get(pdf_path)["pages"]:
+                text += page_text
                 if len(text) >= char_limit:
                     break
             return text[:char_limit] if text else None
@@ -38,54 +83,230 @@ class KnowledgeGraph:
             return None
 
     def extract_keywords(self, text, top_n=10):
-        """Extracts important keywords from the given text."""
-        words = word_tokenize(text.lower())
-        stop_words = set(stopwords.words("english"))
-        keywords = [word for word in words if word.isalnum() and word not in stop_words]
+        """Extracts important keywords from the given text, weighted by the corpus IDF once the graph is built."""
+        return self.keyword_engine.keywords_for(text, top_n)
 
-        # Use frequency-based filtering
-        freq_dist = Counter(keywords)
-        return [word for word, _ in freq_dist.most_common(top_n)]
+    def encode_texts(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        """Encodes texts in batches of similar length (less padding) and returns them in input order."""
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.bert_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            embeddings[batch] = self.bert_model.encode(
+                [texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True
+            )
+        return embeddings
 
-    def build_graph(self):
-        """Builds a knowledge graph from PDFs in the specified folder."""
-        for filename in os.listdir(self.pdf_folder):
+    def _scan_folder(self, saved_papers):
+        """Lists the PDFs in the folder with their content hash, reusing saved hashes of unchanged files."""
+        saved_by_name = {paper["name"]: paper for paper in saved_papers}
+        found = []
+        for filename in sorted(os.listdir(self.pdf_folder)):
             if filename.endswith(".pdf"):
                 pdf_path = os.path.join(self.pdf_folder, filename)
-                text = self.extract_text_from_pdf(pdf_path)
+                stat = os.stat(pdf_path)
+                saved = saved_by_name.get(filename)
+                if saved and saved["size"] == stat.st_size and saved["mtime"] == stat.st_mtime_ns:
+                    content_hash = saved["hash"]  # Unchanged file: skip re-hashing it
+                else:
+                    content_hash = file_hash(pdf_path)
+                found.append({"name": filename, "path": pdf_path, "hash": content_hash,
+                              "size": stat.st_size, "mtime": stat.st_mtime_ns})
+        return found
 
-                if text:  # Only process if text is extracted
-                    keywords = self.extract_keywords(text)
-                    embedding = self.bert_model.encode(text, convert_to_tensor=True)
+    def _add_paper_to_graph(self, filename, keywords):
+        """Adds a paper node and its keyword nodes and edges."""
+        self.kg.add_node(filename, type="paper", keywords=keywords)
 
-                    # Add paper node
-                    self.kg.add_node(filename, type="paper", keywords=keywords)
-                    self.papers[filename] = {"text": text, "embedding": embedding, "path": pdf_path}
+        # Add keyword nodes with frequency info
+        for kw in keywords:
+            if not self.kg.has_node(kw):
+                self.kg.add_node(kw, type="keyword", frequency=1)
+            else:
+                self.kg.nodes[kw]["frequency"] += 1
+            self.kg.add_edge(filename, kw)
 
-                    # Add keyword nodes with frequency info
-                    for kw in keywords:
-                        if not self.kg.has_node(kw):
-                            self.kg.add_node(kw, type="keyword", frequency=1)
-                        else:
-                            self.kg.nodes[kw]["frequency"] += 1
-                        self.kg.add_edge(filename, kw)
+    def build_graph(self):
+        """Builds a knowledge graph from PDFs in the specified folder.
+        Papers are embedded as overlapping full-text chunks; a paper's vector is the mean of its
+        chunks. Saved chunk embeddings are reused by PDF content hash, so only added papers are
+        encoded; if nothing changed since the last build, the saved graph is simply loaded."""
+        saved = self.store.load(EMBEDDING_STORE_KEY)
+        saved_papers, saved_embeddings, saved_graph = saved if saved else ([], None, None)
+        chunks_loaded = self.chunk_index.load(EMBEDDING_STORE_KEY)
 
-        print(f"Knowledge graph built with {len(self.papers)} papers.")
+        found = self._scan_folder(saved_papers)
+        if saved and chunks_loaded and \
+                [(p["name"], p["hash"]) for p in found] == [(p["name"], p["hash"]) for p in saved_papers]:
+            # Nothing added, removed or renamed: startup is just loading the store
+            self.kg = saved_graph
+            for paper, embedding in zip(saved_papers, saved_embeddings):
+                self.papers[paper["name"]] = {"embedding": embedding, "path": paper["path"], "hash": paper["hash"],
+                                              "doi": paper.get("doi"), "year": paper.get("year")}
+            self.index.build(self.papers.keys(), saved_embeddings, normalized=True)
+            if not self.keyword_engine.load(self.keywords_path):
+                self.keyword_engine.fit([self.extract_text_from_pdf(paper["path"]) or "" for paper in saved_papers])
+                self.keyword_engine.save(self.keywords_path)
+            self._sync_lexical_index(saved_papers)
+            fingerprint = PaperGraph.references_fingerprint(self.references_folder)
+            self.paper_graph = PaperGraph.load(self.store.folder, self.index.keys, fingerprint) \
+                or self._build_paper_graph(saved_papers)
+            print(f"Knowledge graph loaded with {len(self.papers)} papers.")
+            return
 
-    def query_papers(self, query, top_k=5):
-        """Finds top-k related papers based on the query and saves them."""
-        query_embedding = self.bert_model.encode(query, convert_to_tensor=True)
-        similarities = []
+        texts = {}
+        for paper in found:
+            text = self.extract_text_from_pdf(paper["path"])
+            if text and text.strip():  # Only process if text is extracted
+                texts[paper["hash"]] = text
+        papers = [paper for paper in found if paper["hash"] in texts]
+        indexed_hashes = {chunk["hash"] for chunk in self.chunk_index.chunks}
+        new_papers = sum(paper["hash"] not in indexed_hashes for paper in papers)
+
+        # Encode the full-text chunks of new papers only, in batched calls to the one loaded model
+        started = time.perf_counter()
+        encoded = self.chunk_index.update(papers, lambda paper: get_pdf_store().get(paper["path"])["pages"],
+                                          self.encode_texts)
+        elapsed = time.perf_counter() - started
+        if encoded:
+            print(f"Encoded {encoded} chunks of {new_papers} papers in {elapsed:.1f}s "
+                  f"({encoded / max(elapsed, 1e-9):.1f} chunks/sec).")
+        papers = [paper for paper in papers if paper["name"] in self.chunk_index]  # Drop PDFs without chunks
+
+        # Keywords are weighted against the whole corpus, so they are recomputed for every paper
+        started = time.perf_counter()
+        self.keyword_engine.fit([texts[paper["hash"]] for paper in papers])
+        for paper, keywords in zip(papers, self.keyword_engine.top_keywords()):
+            paper["keywords"] = keywords
+        print(f"Extracted keywords for {len(papers)} papers in {time.perf_counter() - started:.2f}s.")
+
+        embeddings = self.chunk_index.paper_vectors([paper["name"] for paper in papers])
+        for paper, embedding in zip(papers, embeddings):
+            record = get_pdf_store().get(paper["path"])
+            paper["doi"] = record["metadata"]["doi"]
+            paper["year"] = extract_publication_year(record["pages"][0]) if record["pages"] else None
+            self._add_paper_to_graph(paper["name"], paper["keywords"])
+            self.papers[paper["name"]] = {"embedding": embedding, "path": paper["path"], "hash": paper["hash"],
+                                          "doi": paper["doi"], "year": paper["year"]}
+
+        # One contiguous normalized matrix for all papers, searched with a single matmul per query batch
+        self.index.build(self.papers.keys(), embeddings, normalized=True)
+        self.paper_graph = self._build_paper_graph(papers)
+        self._sync_lexical_index(papers)
+        self.chunk_index.save(EMBEDDING_STORE_KEY)
+        self.keyword_engine.save(self.keywords_path)
+        self.store.save(EMBEDDING_STORE_KEY, papers, embeddings, self.kg)
+        print(f"Knowledge graph built with {len(self.papers)} papers ({new_papers} new), "
+              f"{self.paper_graph.citations.nnz} citation and {self.paper_graph.similarity.nnz // 2} similarity edges.")
 
-        for paper, data in self.papers.items():
-            score = util.pytorch_cos_sim(query_embedding, data["embedding"]).item()
-            similarities.append((paper, score, data["path"]))
+    def _build_paper_graph(self, papers):
+        """Builds the sparse citation and similarity edges between the indexed papers and saves them."""
+        paper_dois = {paper["name"]: paper.get("doi") for paper in papers}
+        paper_graph = PaperGraph.build(self.index, self.references_folder, paper_dois,
+                                       SIMILARITY_NEIGHBOURS, MIN_EDGE_SIMILARITY)
+        paper_graph.save(self.store.folder)
+        return paper_graph
 
-        # Sort papers by similarity score
-        similarities.sort(key=lambda x: x[1], reverse=True)
+    def _sync_lexical_index(self, papers):
+        """Brings the full-text inverted index up to date, re-indexing only added or changed papers."""
+        started = time.perf_counter()
+        updated = self.lexical_index.sync(papers, lambda paper: get_pdf_store().get_text(paper["path"], " "))
+        if updated:
+            print(f"Indexed full text of {updated} papers in {time.perf_counter() - started:.2f}s.")
+
+    def central_papers(self, top_n=10, directed_citations=True):
+        """Ranks papers by PageRank over the paper graph; returns (paper, score) pairs, best first."""
+        scores = self.paper_graph.pagerank(directed_citations=directed_citations)
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(self.paper_graph.names[i], float(scores[i])) for i in order]
+
+    def query_papers_batch(self, queries, top_k=5):
+        """Finds the top-k related papers for each query in one batched search over the full-text chunks.
+        A paper scores as its best-matching chunk."""
+        query_embeddings = self.bert_model.encode(list(queries), convert_to_numpy=True)
+        return [
+            [(paper, score, self.papers[paper]["path"]) for paper, score, _ in hits]
+            for hits in self.chunk_index.search(query_embeddings, top_k)
+        ]
+
+    def query_papers(self, query, top_k=5):
+        """Finds top-k related papers based on the query and saves them."""
+        similarities = self.query_papers_batch([query], top_k)[0]
 
         # Save top-k related papers in the related_papers folder
-        for paper, _, path in similarities[:top_k]:
+        for paper, _, path in similarities:
             shutil.copy(path, os.path.join(self.related_papers_folder, paper))
 
-        return similarities[:top_k]
+        return similarities
+
+    def _passes_filters(self, name, year_range, doi_prefix):
+        paper = self.papers[name]
+        if year_range is not None:
+            year = paper.get("year")
+            if year is None or not (year_range[0] or year) <= year <= (year_range[1] or year):
+                return False
+        if doi_prefix is not None:
+            doi = (paper.get("doi") or "").lower()
+            if not doi.startswith(doi_prefix.lower()):
+                return False
+        return True
+
+    def search(self, query, page=1, page_size=10, fusion="rrf", weights=None,
+               year_range=None, doi_prefix=None, candidates=100):
+        """Hybrid retrieval combining full-text BM25, embedding similarity and graph proximity.
+
+        fusion is "rrf" (reciprocal rank fusion) or "weighted" (min-max normalized scores mixed
+        with weights, default SEARCH_WEIGHTS). year_range is (min_year, max_year), either end may
+        be None; doi_prefix keeps papers whose DOI starts with it. Returns a dict with the total
+        number of matches and the requested page of results."""
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        weights = {**SEARCH_WEIGHTS, **(weights or {})}
+
+        query_embedding = self.bert_model.encode([query], convert_to_numpy=True)
+        signals = {
+            "bm25": self.lexical_index.search(query),
+            "embedding": {},
+        }
+        best_pages = {}
+        for paper, score, page in self.chunk_index.search(query_embedding, candidates)[0]:
+            signals["embedding"][paper] = score
+            best_pages[paper] = page
+
+        # Graph proximity: personalized PageRank seeded with the best lexical and semantic hits
+        seeds = set()
+        for scores in signals.values():
+            seeds.update(sorted(scores, key=scores.get, reverse=True)[:10])
+        seeds &= set(self.paper_graph.positions)
+        if seeds:
+            personalization = np.zeros(len(self.paper_graph.names))
+            personalization[[self.paper_graph.positions[name] for name in seeds]] = 1.0
+            proximity = self.paper_graph.pagerank(personalization=personalization, directed_citations=False)
+            signals["graph"] = {name: float(proximity[i]) for i, name in enumerate(self.paper_graph.names)}
+        else:
+            signals["graph"] = {}
+
+        matches = [name for name in sorted(set(signals["bm25"]) | set(signals["embedding"]))
+                   if name in self.papers and self._passes_filters(name, year_range, doi_prefix)]
+
+        fused = dict.fromkeys(matches, 0.0)
+        for signal, scores in signals.items():
+            ranked = sorted((name for name in matches if name in scores), key=scores.get, reverse=True)
+            if fusion == "rrf":
+                for rank, name in enumerate(ranked, start=1):
+                    fused[name] += 1.0 / (RRF_K + rank)
+            elif ranked:
+                high, low = scores[ranked[0]], scores[ranked[-1]]
+                for name in ranked:
+                    fused[name] += weights[signal] * ((scores[name] - low) / (high - low) if high > low else 1.0)
+
+        ranked = sorted(matches, key=lambda name: (-fused[name], name))
+        start = (page - 1) * page_size
+        results = [
+            {"paper": name, "score": fused[name], "path": self.papers[name]["path"],
+             "doi": self.papers[name].get("doi"), "year": self.papers[name].get("year"),
+             "page": best_pages.get(name),
+             **{signal: scores.get(name) for signal, scores in signals.items()}}
+            for name in ranked[start:start + page_size]
+        ]
+        return {"total": len(ranked), "page": page, "page_size": page_size, "results": results}
@@ -3,9 +3,68 @@ import json
 import os
 import requests
 import time
+import threading
+import concurrent.futures
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from crawl_frontier import CrawlFrontier, normalize_doi
+from http_client import get_http_client
+from pdf_download import DownloadError, download_pdf_file, format_bytes, is_pdf_file
+
+ATOM_NS = {"atom": "http://www.w3.org/2005/Atom"}
+# DOIs per batched metadata request (OpenAlex caps OR filters at 100 values, Semantic Scholar batches at 500)
+OPENALEX_BATCH_SIZE = 50
+SEMANTIC_SCHOLAR_BATCH_SIZE = 500
+
+class SourceStats:
+    """
+    Tracks latency (exponential moving average) and hit rate of each open-access source.
+    Sources are queried fastest-and-most-useful first, and sources that almost never
+    return a PDF are skipped, except for an occasional probe to notice if they recover.
+    """
+
+    def __init__(self, alpha=0.2, min_attempts=20, min_hit_rate=0.02, probe_every=25):
+        self.alpha = alpha
+        self.min_attempts = min_attempts
+        self.min_hit_rate = min_hit_rate
+        self.probe_every = probe_every
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, source, latency, hit):
+        """Records the outcome of one query against a source."""
+        with self._lock:
+            entry = self.stats.setdefault(source, {"attempts": 0, "hits": 0, "skipped": 0, "latency": latency})
+            entry["attempts"] += 1
+            entry["hits"] += int(hit)
+            entry["latency"] = (1 - self.alpha) * entry["latency"] + self.alpha * latency
+
+    def hit_rate(self, source):
+        entry = self.stats.get(source)
+        return entry["hits"] / entry["attempts"] if entry and entry["attempts"] else 1.0
+
+    def ordered(self, sources):
+        """Returns the sources worth querying, best expected payoff (hits per second) first."""
+        with self._lock:
+            def score(source):
+                entry = self.stats.get(source)
+                return self.hit_rate(source) / max(entry["latency"], 1e-3) if entry else float("inf")
+
+            selected = []
+            for source in sorted(sources, key=score, reverse=True):
+                entry = self.stats.get(source)
+                unproductive = entry and entry["attempts"] >= self.min_attempts and self.hit_rate(source) < self.min_hit_rate
+                if unproductive:
+                    entry["skipped"] += 1
+                    if entry["skipped"] % self.probe_every:
+                        continue
+                selected.append(source)
+            return selected
+
+source_stats = SourceStats()
+# Shared pool so that a losing source can finish in the background without blocking the winner
+_source_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16)
 
 class PaperDownloader:
     """
@@ -20,8 +79,8 @@ class PaperDownloader:
 
     @staticmethod
     def read_dois_from_json(folder_path):
-        """Reads all JSON files in a folder and extracts valid DOIs."""
-        dois = []
+        """Reads all JSON files in a folder and extracts unique, normalized DOIs."""
+        dois = {}  # Ordered set: the first occurrence decides the download order
         for file in os.listdir(folder_path):
             if file.endswith(".json"):
                 file_path = os.path.join(folder_path, file)
@@ -30,74 +89,174 @@ class PaperDownloader:
                     for entry in data:
                         doi = entry.get("DOI")
                         if doi and doi.lower() not in ["no doi found", "not found"]:
-                            cleaned_doi = PaperDownloader.clean_doi(doi)
-                            dois.append(cleaned_doi)
-        return dois
+                            dois.setdefault(normalize_doi(doi), None)
+        return list(dois)
+
+    @staticmethod
+    def query_json_source(url):
+        """Queries a JSON-based source (Semantic Scholar or OpenAlex) for a PDF URL."""
+        response = get_http_client().get(url, timeout=10)
+        if response.status_code != 200:
+            print(f"Warning: Failed request ({response.status_code}) for {url}")
+            return None
+        try:
+            data = response.json()
+            return data.get("pdf_url") or data.get("open_access_pdf")
+        except json.JSONDecodeError:
+            print(f"Error: Could not parse JSON from {url}. Skipping.")
+            return None
+
+    @staticmethod
+    def query_arxiv(url):
+        """Queries the arXiv export API (which returns Atom XML) for a PDF URL."""
+        response = get_http_client().get(url, timeout=10)
+        if response.status_code != 200:
+            print(f"Warning: Failed request ({response.status_code}) for {url}")
+            return None
+        root = ET.fromstring(response.text)
+        pdf_links = [entry.find("atom:link[@title='pdf']", ATOM_NS) for entry in root.findall("atom:entry", ATOM_NS)]
+        pdf_urls = [link.attrib["href"] for link in pdf_links if link is not None]
+        return pdf_urls[0] if pdf_urls else None
+
+    @staticmethod
+    def is_arxiv_doi(doi):
+        """True for DOIs of arXiv preprints, which the batch sources often lack a PDF for."""
+        return "10.48550" in doi or "arxiv" in doi.lower()
+
+    @staticmethod
+    def arxiv_query_url(doi):
+        """arXiv export API URL for the arXiv ID at the end of a DOI."""
+        return f"https://export.arxiv.org/api/query?id_list={doi.split('/')[-1]}"
+
+    @staticmethod
+    def _timed_query(source, query, url):
+        """Runs one source query and records its latency and whether it found a PDF."""
+        started = time.monotonic()
+        pdf_url = None
+        try:
+            pdf_url = query(url)
+        except (requests.exceptions.RequestException, ET.ParseError) as e:
+            print(f"Error contacting {url}: {e}")
+        source_stats.record(source, time.monotonic() - started, bool(pdf_url))
+        return pdf_url
 
     @staticmethod
     def search_open_access(doi):
-        """Searches for a paper in open-access repositories (Semantic Scholar, OpenAlex, arXiv)."""
-        sources = [
-            f"https://api.semanticscholar.org/v1/paper/{doi}",
-            f"https://api.openalex.org/works/https://doi.org/{doi}",
-        ]
+        """Searches open-access repositories (Semantic Scholar, OpenAlex, arXiv) concurrently.
+        The first source to return a PDF URL wins; queued queries for the other sources are cancelled."""
+        sources = {
+            "semantic_scholar": (PaperDownloader.query_json_source, f"https://api.semanticscholar.org/v1/paper/{doi}"),
+            "openalex": (PaperDownloader.query_json_source, f"https://api.openalex.org/works/https://doi.org/{doi}"),
+        }
 
         # Special handling for arXiv
-        if "10.48550" in doi or "arxiv" in doi.lower():
-            arxiv_id = doi.split("/")[-1]  # Extract arXiv ID
-            sources.append(f"https://export.arxiv.org/api/query?id_list={arxiv_id}")
-
-        for url in sources:
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code != 200:
-                    print(f"Warning: Failed request ({response.status_code}) for {url}")
-                    continue
-
-                # Handle JSON-based sources (Semantic Scholar & OpenAlex)
-                if "semanticscholar.org" in url or "openalex.org" in url:
-                    try:
-                        data = response.json()
-                        pdf_url = data.get("pdf_url") or data.get("open_access_pdf")
-                        if pdf_url:
-                            return pdf_url  # Return first found PDF URL
-                    except json.JSONDecodeError:
-                        print(f"Error: Could not parse JSON from {url}. Skipping.")
-
-                # Handle arXiv (which returns XML)
-                elif "arxiv.org" in url:
-                    root = ET.fromstring(response.text)
-                    pdf_links = [entry.find("link[@title='pdf']") for entry in root.findall("entry")]
-                    pdf_urls = [link.attrib["href"] for link in pdf_links if link is not None]
-
-                    if pdf_urls:
-                        return pdf_urls[0]
-
-            except requests.exceptions.RequestException as e:
-                print(f"Error contacting {url}: {e}")
+        if PaperDownloader.is_arxiv_doi(doi):
+            sources["arxiv"] = (PaperDownloader.query_arxiv, PaperDownloader.arxiv_query_url(doi))
+
+        futures = [
+            _source_executor.submit(PaperDownloader._timed_query, source, *sources[source])
+            for source in source_stats.ordered(list(sources))
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                pdf_url = future.result()
+                if pdf_url:
+                    return pdf_url  # Return first found PDF URL
+        finally:
+            for future in futures:
+                future.cancel()
 
         return None  # No PDF found
 
+    @staticmethod
+    def query_openalex_batch(dois):
+        """Looks up PDF URLs for a chunk of DOIs with a single OpenAlex filter request."""
+        dois = [doi for doi in dois if "|" not in doi and "," not in doi]  # Would break the OR filter
+        if not dois:
+            return {}
+        url = "https://api.openalex.org/works"
+        params = {"filter": "doi:" + "|".join(dois), "per-page": len(dois), "select": "doi,best_oa_location"}
+        response = get_http_client().get(url, params=params, timeout=30)
+        if response.status_code != 200:
+            print(f"Warning: Failed OpenAlex batch request ({response.status_code}) for {len(dois)} DOIs")
+            return {}
+
+        pdf_urls = {}
+        for work in response.json().get("results", []):
+            location = work.get("best_oa_location") or {}
+            if work.get("doi") and location.get("pdf_url"):
+                pdf_urls[normalize_doi(work["doi"])] = location["pdf_url"]
+        return pdf_urls
+
+    @staticmethod
+    def query_semantic_scholar_batch(dois):
+        """Looks up PDF URLs for a chunk of DOIs with a single Semantic Scholar batch request."""
+        url = "https://api.semanticscholar.org/graph/v1/paper/batch"
+        response = get_http_client().post(url, params={"fields": "openAccessPdf"},
+                                          json={"ids": [f"DOI:{doi}" for doi in dois]}, timeout=30)
+        if response.status_code != 200:
+            print(f"Warning: Failed Semantic Scholar batch request ({response.status_code}) for {len(dois)} DOIs")
+            return {}
+
+        pdf_urls = {}
+        for doi, paper in zip(dois, response.json()):  # Results come back in request order, None if unknown
+            pdf = (paper or {}).get("openAccessPdf") or {}
+            if pdf.get("url"):
+                pdf_urls[doi] = pdf["url"]
+        return pdf_urls
+
+    @staticmethod
+    def batch_search_open_access(dois):
+        """Resolves PDF URLs for many normalized DOIs with one request per chunk instead of one per DOI.
+        The batch sources are asked one after the other in source_stats order (OpenAlex first until
+        there are stats), each only for the DOIs still missing; remaining arXiv DOIs go to arXiv individually."""
+        pdf_urls = {}
+        batches = {
+            "openalex": (PaperDownloader.query_openalex_batch, OPENALEX_BATCH_SIZE),
+            "semantic_scholar": (PaperDownloader.query_semantic_scholar_batch, SEMANTIC_SCHOLAR_BATCH_SIZE),
+        }
+        for source in source_stats.ordered(list(batches)):
+            query_batch, chunk_size = batches[source]
+            pending = [doi for doi in dois if doi not in pdf_urls]
+            for i in range(0, len(pending), chunk_size):
+                chunk = pending[i:i + chunk_size]
+                started = time.monotonic()
+                found = {}
+                try:
+                    found = query_batch(chunk)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    print(f"Error in batch lookup with {query_batch.__name__}: {e}")
+                # Per-DOI latency and hits, comparable with single-DOI queries of the same source
+                latency = (time.monotonic() - started) / len(chunk)
+                for doi in chunk:
+                    source_stats.record(source, latency, doi in found)
+                pdf_urls.update(found)
+
+        # Only arXiv is left to ask: the batch requests already covered Semantic Scholar and OpenAlex
+        for doi in dois:
+            if doi not in pdf_urls and PaperDownloader.is_arxiv_doi(doi):
+                pdf_url = PaperDownloader._timed_query("arxiv", PaperDownloader.query_arxiv,
+                                                       PaperDownloader.arxiv_query_url(doi))
+                if pdf_url:
+                    pdf_urls[doi] = pdf_url
+        return pdf_urls
+
     @staticmethod
     def download_paper(doi, pdf_url, output_folder):
         """Downloads a paper from a given URL."""
         os.makedirs(output_folder, exist_ok=True)
         file_path = os.path.join(output_folder, f"{doi.replace('/', '_')}.pdf")
 
-        # Avoid duplicate downloads
-        if os.path.exists(file_path):
+        # Avoid duplicate downloads (only complete, valid PDFs ever land at file_path)
+        if is_pdf_file(file_path):
             print(f"File already exists, skipping: {file_path}")
             return True
 
         try:
-            response = requests.get(pdf_url, stream=True, timeout=10)
-            if response.status_code == 200:
-                with open(file_path, "wb") as pdf_file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        pdf_file.write(chunk)
-                print(f"Downloaded: {file_path}")
-                return True
-        except requests.exceptions.RequestException as e:
+            stats = download_pdf_file(pdf_url, file_path)
+            print(f"Downloaded: {file_path} ({format_bytes(stats['bytes'])}, {format_bytes(stats['bytes_per_sec'])}/s)")
+            return True
+        except (requests.exceptions.RequestException, DownloadError) as e:
             print(f"Error downloading {doi} from {pdf_url}: {e}")
 
         return False
@@ -113,12 +272,12 @@ class PaperDownloader:
         file_path = os.path.join(output_folder, f"{doi.replace('/', '_')}_scihub.pdf")
 
         # Avoid duplicate downloads
-        if os.path.exists(file_path):
+        if is_pdf_file(file_path):
             print(f"File already exists, skipping Sci-Hub download: {file_path}")
             return True
 
         try:
-            response = requests.get(sci_hub_url, headers=headers, timeout=10)
+            response = get_http_client().get(sci_hub_url, headers=headers, timeout=10)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, "html.parser")
             embed_tag = soup.find("embed") or soup.find("iframe")
@@ -129,14 +288,13 @@ class PaperDownloader:
                     pdf_url = "https:" + pdf_url
                 full_pdf_url = urljoin(sci_hub_url, pdf_url)
 
-                pdf_response = requests.get(full_pdf_url, headers=headers, timeout=10)
-                if pdf_response.status_code == 200:
-                    with open(file_path, "wb") as pdf_file:
-                        pdf_file.write(pdf_response.content)
-                    print(f"Downloaded via Sci-Hub: {file_path}")
+                try:
+                    stats = download_pdf_file(full_pdf_url, file_path, headers=headers)
+                    print(f"Downloaded via Sci-Hub: {file_path} ({format_bytes(stats['bytes'])}, "
+                          f"{format_bytes(stats['bytes_per_sec'])}/s)")
                     return True
-                else:
-                    print(f"Failed to download PDF for DOI {doi}")
+                except DownloadError as e:
+                    print(f"Failed to download PDF for DOI {doi}: {e}")
             else:
                 print(f"PDF not found for DOI {doi}")
         except requests.exceptions.RequestException as e:
@@ -145,29 +303,32 @@ class PaperDownloader:
         return False
 
 # Function to run Crew
-def download_papers_from_dois(references_folder="/content/references", output_folder="/content/downloaded_papers"):
-    """Runs the CrewAI pipeline to extract DOIs, search open-access papers, and download them."""
-
-    # Refresh output folder before starting
-    if os.path.exists(output_folder):
-        for file in os.listdir(output_folder):
-            file_path = os.path.join(output_folder, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        print(f"Output folder {output_folder} cleared.")
-    else:
-        os.makedirs(output_folder, exist_ok=True)
+def download_papers_from_dois(references_folder="/content/references", output_folder="/content/downloaded_papers", frontier=None):
+    """Runs the CrewAI pipeline to extract DOIs, search open-access papers, and download them.
+    DOIs already in the crawl frontier (visited at an earlier level or run) are skipped, and
+    previously downloaded papers are kept so reruns only fetch what is new. Without a frontier,
+    one is kept next to the downloads in output_folder."""
+    os.makedirs(output_folder, exist_ok=True)
+    own_frontier = frontier is None
+    if own_frontier:
+        frontier = CrawlFrontier(os.path.join(output_folder, ".crawl_frontier"))
 
-    dois = PaperDownloader.read_dois_from_json(references_folder)
+    try:
+        dois = [doi for doi in PaperDownloader.read_dois_from_json(references_folder) if doi not in frontier]
+        pdf_urls = PaperDownloader.batch_search_open_access(dois)
 
-    for doi in dois:
-        pdf_url = PaperDownloader.search_open_access(doi)
-        if pdf_url:
-            success = PaperDownloader.download_paper(doi, pdf_url, output_folder)
-            if not success:
+        for doi in dois:
+            pdf_url = pdf_urls.get(doi)
+            if pdf_url:
+                success = PaperDownloader.download_paper(doi, pdf_url, output_folder)
+                if not success:
+                    PaperDownloader.fallback_to_scihub(doi, output_folder)
+            else:
                 PaperDownloader.fallback_to_scihub(doi, output_folder)
-        else:
-            PaperDownloader.fallback_to_scihub(doi, output_folder)
+            frontier.add(doi)  # Only after the attempt, so an interrupted run retries this DOI
+    finally:
+        if own_frontier:
+            frontier.close()
 
 # Example Usage:
 # download_papers_from_dois("/content/references", "/content/downloaded_papers")
@@ -1,11 +1,19 @@
 from crewai import Agent, Task, Crew
-import fitz  # PyMuPDF for PDF text extraction
 import re
 import requests
 import time
 import json
 import os
 import concurrent.futures
+from doi_cache import get_doi_cache
+from pdf_store import file_hash, get_pdf_store, parse_pdfs_parallel
+from run_manifest import get_run_manifest
+from http_client import get_http_client
+
+# Concurrent CrossRef lookups per paper; the per-host rate limiter keeps the total under the API limit
+CROSSREF_MAX_WORKERS = int(os.getenv("CROSSREF_MAX_WORKERS", 8))
+# Contact address that places requests in CrossRef's faster "polite" pool
+CROSSREF_MAILTO = os.getenv("CROSSREF_MAILTO")
 
 class ReferenceExtractor:
     """
@@ -14,10 +22,8 @@ class ReferenceExtractor:
     """
     @staticmethod
     def extract_text_from_pdf(pdf_path):
-        """Extracts text from a PDF file."""
-        doc = fitz.open(pdf_path)
-        text = "\n".join([page.get_text("text") for page in doc])
-        return text
+        """Extracts text from a PDF file (parsed once and shared through the PDF store)."""
+        return get_pdf_store().get_text(pdf_path, separator="\n")
 
     @staticmethod
     def extract_references_section(text):
@@ -34,16 +40,26 @@ class ReferenceExtractor:
 
     @staticmethod
     def validate_reference(reference):
-      """Validates references using CrossRef API with better error handling."""
-      base_url = "https://api.crossref.org/works?query="
-      query_url = f"{base_url}{reference}"
+      """Validates references using CrossRef API, answering repeat lookups from the on-disk DOI cache."""
+      cache = get_doi_cache()
+      hit, cached_doi = cache.get(reference)
+      if hit:
+          return cached_doi or "Not Found"
+
+      base_url = "https://api.crossref.org/works"
+      params = {"query": reference}  # Encoded by requests, so '&' or '#' in a reference can't break the query
+      if CROSSREF_MAILTO:
+          params["mailto"] = CROSSREF_MAILTO
 
       try:
-          response = requests.get(query_url, timeout=5)  # Reduce timeout
+          response = get_http_client().get(base_url, params=params, timeout=5)  # Reduce timeout
           if response.status_code == 200:
               data = response.json()
               if "message" in data and "items" in data["message"] and data["message"]["items"]:
-                  return data["message"]["items"][0].get("DOI", "No DOI found")
+                  doi = data["message"]["items"][0].get("DOI")
+                  cache.set(reference, doi)
+                  return doi or "No DOI found"
+              cache.set(reference, None)  # Cache the miss with the shorter negative TTL
       except requests.exceptions.Timeout:
           return "Not Found (Timeout)"
       except requests.RequestException as e:
@@ -52,8 +68,8 @@ class ReferenceExtractor:
       return "Not Found"
 
     @staticmethod
-    def validate_references_parallel(references, max_workers=10):
-        """Validates references using multi-threading to speed up processing."""
+    def validate_references_parallel(references, max_workers=CROSSREF_MAX_WORKERS):
+        """Validates references on a bounded thread pool, rate limited per API host."""
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             results = list(executor.map(ReferenceExtractor.validate_reference, references))
         return results
@@ -120,30 +136,34 @@ reference_extraction_crew = Crew(
 )
 
 # Function to run Crew for a single PDF
-def extract_references_from_pdf(pdf_path, output_folder="/content/references", output_json=True):
-    """Runs the CrewAI pipeline to extract and validate references from a PDF and save to JSON in a specific folder."""
+def extract_references_from_pdf(pdf_path, output_folder="/content/references", output_json=True, max_workers=CROSSREF_MAX_WORKERS):
+    """Runs the CrewAI pipeline to extract and validate references from a PDF and save to JSON in a specific folder.
+    PDFs whose references were already extracted from the same content are answered from the saved JSON."""
+    filename = os.path.splitext(os.path.basename(pdf_path))[0] + "_references.json"
+    json_path = os.path.join(output_folder, filename)
+    manifest = get_run_manifest()
+    content_hash = file_hash(pdf_path)
+    if output_json and manifest.is_done("references", json_path, content_hash):
+        with open(json_path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+
     text = ReferenceExtractor.extract_text_from_pdf(pdf_path)
     references_section = ReferenceExtractor.extract_references_section(text)
     references = ReferenceExtractor.extract_references(references_section)
-    validated_references = [{"reference": ref, "DOI": ReferenceExtractor.validate_reference(ref)} for ref in references]
+    dois = ReferenceExtractor.validate_references_parallel(references, max_workers=max_workers)
+    validated_references = [{"reference": ref, "DOI": doi} for ref, doi in zip(references, dois)]
 
     if output_json:
-        filename = os.path.splitext(os.path.basename(pdf_path))[0] + "_references.json"
         ReferenceExtractor.save_to_json(validated_references, folder=output_folder, filename=filename)
+        manifest.mark_done("references", json_path, content_hash)
 
     return validated_references
 
 # Function to process multiple PDFs in a folder
 def process_pdfs_in_folder(folder_path="/content/research_papers", output_folder="/content/references"):
-    """Processes all PDFs in a given folder and extracts references from each after refreshing output folder once."""
-    if os.path.exists(output_folder):
-        for file in os.listdir(output_folder):
-            file_path = os.path.join(output_folder, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        print(f"Output folder {output_folder} cleared.")
-    else:
-        os.makedirs(output_folder, exist_ok=True)
+    """Processes all PDFs in a given folder and extracts references from each.
+    Existing results are kept; only new or changed PDFs are processed again."""
+    os.makedirs(output_folder, exist_ok=True)
 
     if not os.path.exists(folder_path):
         print(f"Folder {folder_path} does not exist.")
@@ -154,9 +174,13 @@ def process_pdfs_in_folder(folder_path="/content/research_papers", output_folder
         print("No PDF files found in the folder.")
         return
 
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(folder_path, pdf_file)
-        print(f"Processing: {pdf_file}")
+    # Parse PDFs on all cores; references are validated as soon as each chunk has been parsed
+    pdf_paths = [os.path.join(folder_path, pdf_file) for pdf_file in pdf_files]
+    for pdf_path, error in parse_pdfs_parallel(pdf_paths):
+        if error:
+            print(f"Could not parse {os.path.basename(pdf_path)}: {error}")
+            continue
+        print(f"Processing: {os.path.basename(pdf_path)}")
         extract_references_from_pdf(pdf_path, output_folder=output_folder)
 
 # Example Usage:
@@ -1,24 +1,49 @@
 import fitz  # PyMuPDF
-import pdfplumber
-import re
 import os
 import json
+import re
 import shutil
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# Load API key from .env file
-load_dotenv()
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-
-# Configure Gemini API
-genai.configure(api_key=gemini_api_key)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_scheduler import estimate_tokens, get_llm_scheduler
+from pdf_store import file_hash, get_pdf_store, parse_pdfs_parallel
+from run_manifest import get_run_manifest
 
 # Define folder paths
 PDF_FOLDER = "./related_papers"   # Folder containing PDFs
 OUTPUT_FOLDER = "./extracted_images"  # Folder for extracted images
 SUMMARY_FOLDER = "./structured_summaries"  # Folder for summaries
 
+# Placeholder summaries returned when Gemini gives no answer; these are never checkpointed
+SUMMARY_UNAVAILABLE = ("Summary not available.", "Summary not available due to API error.")
+# Papers being prepared and summarised at once; the LLM scheduler enforces the API budgets
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 16))
+# Bump when the summary prompts change, so cached responses to the old prompts are not reused
+SUMMARY_PROMPT_VERSION = "summary-v1"
+SECTION_PROMPT_VERSION = "section-summary-v1"
+REDUCE_PROMPT_VERSION = "summary-reduce-v1"
+# "map_reduce" summarises the full text section by section; "single" sends only the first 2000 characters
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "map_reduce")
+# Token budgets of one section prompt and of the final reduce prompt
+SECTION_TOKEN_BUDGET = 3000
+REDUCE_TOKEN_BUDGET = 6000
+
+# Section names recognised as headings when they stand alone on a line, optionally numbered ("2.1 Methods")
+SECTION_NAMES = (r"abstract|introduction|background|related work|methods?|methodology|materials and methods|"
+                 r"approach|experiments?|experimental setup|results?|evaluation|discussion|conclusions?|"
+                 r"limitations|future work|acknowledge?ments?|references|bibliography|appendix")
+# A heading line is either a section name alone (two may be joined by "and"/"&"), or a numbered
+# title-case line ("3 Proposed Approach"); the title branch is case-sensitive so that wrapped
+# sentences such as "12 Layers were used in total" do not count
+SECTION_HEADING = re.compile(
+    rf"^[ \t]*(?:(?:\d{{1,2}}(?:\.\d{{1,2}})*\.?[ \t]+)?(?i:{SECTION_NAMES})(?:[ \t]+(?:and|&)[ \t]+(?i:{SECTION_NAMES}))?[ \t]*:?"
+    r"|\d{1,2}(?:\.\d{1,2})*\.?[ \t]+[A-Z][A-Za-z-]*(?:[ \t]+(?:[A-Z][A-Za-z:-]*|and|of|for|in|on|the|a|an|to|with|&))*:?)"
+    r"[ \t]*$",
+    re.MULTILINE,
+)
+END_SECTIONS = ("references", "bibliography", "acknowledgement", "acknowledgment")
+# A reference-list heading only ends the paper when it is in this last fraction of the text
+END_SECTION_TAIL = 0.5
+
 def refresh_output_folders():
     """Deletes and recreates output folders **only once** before processing the first PDF."""
     for folder in [OUTPUT_FOLDER, SUMMARY_FOLDER]:
@@ -28,45 +53,27 @@ def refresh_output_folders():
 
 def extract_metadata_from_pdf(pdf_path):
     """Extracts title, authors, and DOI from the first page of a PDF."""
-    doc = fitz.open(pdf_path)
-    first_page_text = doc[0].get_text("text")
-
-    # Extract Title (First Large Text Line)
-    title = first_page_text.split("\n")[0].strip()
-
-    # Extract Authors (Lines after title but before Abstract)
-    author_lines = []
-    for line in first_page_text.split("\n")[1:]:
-        if "abstract" in line.lower():
-            break
-        author_lines.append(line.strip())
-
-    authors = ", ".join(author_lines)
-
-    # Extract DOI
-    doi_match = re.search(r"10\.\d{4,9}/[-._;()/:A-Z0-9]+", first_page_text, re.I)
-    doi = doi_match.group(0) if doi_match else "DOI not found"
-
-    return title, authors, doi
+    metadata = get_pdf_store().get(pdf_path)["metadata"]
+    return metadata["title"], metadata["authors"], metadata["doi"]
 
 def extract_text_from_pdf(pdf_path):
     """Extracts text from a PDF."""
-    doc = fitz.open(pdf_path)
-    return "\n\n".join(page.get_text("text") for page in doc).strip()
+    return get_pdf_store().get_text(pdf_path, separator="\n\n").strip()
 
 def extract_images_from_pdf(pdf_path):
     """Extracts images from a PDF and saves them."""
-    doc = fitz.open(pdf_path)
-    image_paths = []
+    images = get_pdf_store().get(pdf_path)["images"]
+    if not images:
+        return []  # No need to open the PDF at all
 
-    for page_num, page in enumerate(doc):
-        for img_index, img in enumerate(page.get_images(full=True)):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
+    image_paths = []
+    with fitz.open(pdf_path) as doc:
+        for img in images:
+            base_image = doc.extract_image(img["xref"])
             image_bytes = base_image["image"]
             image_ext = base_image["ext"]
 
-            image_filename = f"{OUTPUT_FOLDER}/{os.path.basename(pdf_path).replace('.pdf', '')}_page_{page_num + 1}_img_{img_index + 1}.{image_ext}"
+            image_filename = f"{OUTPUT_FOLDER}/{os.path.basename(pdf_path).replace('.pdf', '')}_page_{img['page']}_img_{img['index']}.{image_ext}"
             with open(image_filename, "wb") as f:
                 f.write(image_bytes)
             image_paths.append(image_filename)
@@ -75,18 +82,122 @@ def extract_images_from_pdf(pdf_path):
 
 def extract_tables_from_pdf(pdf_path):
     """Extracts tables from a PDF using pdfplumber."""
-    tables = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            table = page.extract_table()
-            if table:
-                tables.append({"page": page_num + 1, "table_data": table})
-    return tables
-
-def summarize_with_gemini(text, figures, tables):
-    """Summarizes extracted text while referencing figures and tables."""
+    return get_pdf_store().get(pdf_path, include_tables=True)["tables"]
+
+def split_into_sections(text):
+    """Splits paper text at section headings; returns (heading, body) pairs without the reference list.
+    The paper is cut only at the last reference-list heading, and only if it is in the tail of the text."""
+    headings = list(SECTION_HEADING.finditer(text))
+    end_positions = [
+        i for i, heading in enumerate(headings)
+        if re.sub(r"^[\d.\s]+", "", heading.group(0).strip()).lower().startswith(END_SECTIONS)
+        and heading.start() >= len(text) * (1 - END_SECTION_TAIL)
+    ]
+    if end_positions:
+        text = text[:headings[end_positions[-1]].start()]  # Nothing after the references is worth summarising
+        headings = headings[:end_positions[-1]]
+
+    sections = []
+    if not headings or headings[0].start() > 0:
+        sections.append(("Front matter", text[:headings[0].start() if headings else len(text)]))
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        sections.append((heading.group(0).strip(), text[heading.end():end]))
+    return [(title, body.strip()) for title, body in sections if body.strip()]
+
+def chunk_sections(sections, token_budget=SECTION_TOKEN_BUDGET):
+    """Splits sections longer than the token budget at paragraph boundaries; returns (title, text) chunks."""
+    max_chars = token_budget * 4
+    chunks = []
+    for title, body in sections:
+        parts, current = [], ""
+        for paragraph in re.split(r"\n\s*\n", body):
+            if current and len(current) + len(paragraph) + 2 > max_chars:
+                parts.append(current)
+                current = ""
+            while len(paragraph) > max_chars:  # A single oversized paragraph is cut hard
+                parts.append(paragraph[:max_chars])
+                paragraph = paragraph[max_chars:]
+            if current and len(current) + len(paragraph) + 2 > max_chars:
+                parts.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            parts.append(current)
+        for index, part in enumerate(parts):
+            chunks.append((title if len(parts) == 1 else f"{title} (part {index + 1}/{len(parts)})", part))
+    return chunks
+
+def section_prompt(title, text):
+    return f"""
+    You are summarising one part of an academic paper.
+
+    --- Section: {title} ---
+    {text}
+
+    Summarise this part in a few sentences: its aims, methods and results (keep key numbers),
+    and mention any figures or tables it refers to.
+    """
+
+def summarize_sections(text):
+    """Map step: summarises every section chunk of the full text in parallel.
+    Each chunk is a separate cached call, so only chunks whose text changed are re-summarised.
+    Section summaries are merged in order until they fit the reduce budget."""
+    scheduler = get_llm_scheduler()
+    chunks = chunk_sections(split_into_sections(text))
+    futures = [scheduler.submit(section_prompt(title, chunk), template=SECTION_PROMPT_VERSION) for title, chunk in chunks]
+    summaries = [(title, future.result()) for (title, _), future in zip(chunks, futures)]
+
+    # Too many sections for one reduce prompt: summarise consecutive groups until they fit
+    while sum(estimate_tokens(summary) for _, summary in summaries) > REDUCE_TOKEN_BUDGET and len(summaries) > 1:
+        groups, current = [], []
+        for title, summary in summaries:
+            if current and sum(estimate_tokens(s) for _, s in current) + estimate_tokens(summary) > SECTION_TOKEN_BUDGET:
+                groups.append(current)
+                current = []
+            current.append((title, summary))
+        groups.append(current)
+        if len(groups) == len(summaries):
+            break  # Every summary is already over budget on its own
+        futures = [
+            scheduler.submit(section_prompt(f"{group[0][0]} to {group[-1][0]}",
+                                            "\n\n".join(f"{t}: {s}" for t, s in group)),
+                             template=SECTION_PROMPT_VERSION)
+            for group in groups
+        ]
+        summaries = [(f"{group[0][0]} to {group[-1][0]}", future.result()) for group, future in zip(groups, futures)]
+    return summaries
+
+def summarize_with_map_reduce(text, figures, tables):
+    """Summarises the full paper text: section summaries in parallel (map), then one structured summary (reduce)."""
+    section_summaries = "\n\n".join(f"### {title}\n{summary}" for title, summary in summarize_sections(text))
+    reduce_prompt = f"""
+    You are an AI researcher summarizing an academic paper. Summaries of its sections are provided below.
+    Include references to figures and tables in the summary where applicable.
+
+    --- Section Summaries ---
+    {section_summaries}
+
+    --- Figures & Tables ---
+    Figures: {len(figures)} extracted
+    Tables: {len(tables)} extracted
+
+    Summarize this paper in a structured format:
+    1. Introduction
+    2. Key Findings
+    3. Important Figures & Tables (mention their relevance)
+    4. Conclusion
+    """
+    return get_llm_scheduler().generate(reduce_prompt, template=REDUCE_PROMPT_VERSION)
+
+def summarize_with_gemini(text, figures, tables, mode=None):
+    """Summarizes extracted text while referencing figures and tables.
+    The call goes through the shared LLM scheduler, so many papers can be summarised concurrently,
+    and an unchanged paper is answered from the LLM response cache. mode defaults to SUMMARY_MODE."""
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
+        if (mode or SUMMARY_MODE) == "map_reduce" and text.strip():
+            response_text = summarize_with_map_reduce(text, figures, tables)
+            return response_text if response_text else "Summary not available."
 
         structured_prompt = f"""
         You are an AI researcher summarizing an academic paper. The extracted text is provided below.
@@ -106,8 +217,8 @@ def summarize_with_gemini(text, figures, tables):
         4. Conclusion
         """
 
-        response = model.generate_content(structured_prompt)
-        return response.text if response.text else "Summary not available."
+        response_text = get_llm_scheduler().generate(structured_prompt, template=SUMMARY_PROMPT_VERSION)
+        return response_text if response_text else "Summary not available."
     except Exception as e:
         print(f"Error in Gemini API call: {e}")
         return "Summary not available due to API error."
@@ -126,6 +237,7 @@ def format_summary(title, authors, doi, text_summary, figures, tables):
 def generate_summary_report(pdf_path):
     """Full pipeline: Extract metadata, summarize, and format the research paper content."""
     print(f"📄 Processing: {os.path.basename(pdf_path)}")
+    get_pdf_store().get(pdf_path, include_tables=True)  # Parse text, images and tables in a single pass
 
     title, authors, doi = extract_metadata_from_pdf(pdf_path)
     extracted_text = extract_text_from_pdf(pdf_path)
@@ -135,26 +247,63 @@ def generate_summary_report(pdf_path):
 
     final_summary = format_summary(title, authors, doi, text_summary, extracted_images, extracted_tables)
 
-    output_filename = os.path.join(SUMMARY_FOLDER, os.path.basename(pdf_path).replace(".pdf", ".json"))
+    output_filename = summary_path(pdf_path)
     with open(output_filename, "w", encoding="utf-8") as f:
         json.dump(final_summary, f, indent=4, ensure_ascii=False)
 
+    if text_summary not in SUMMARY_UNAVAILABLE:
+        get_run_manifest().mark_done("summary", output_filename, file_hash(pdf_path))
     print(f"✅ Summary saved: {output_filename}")
 
-def process_all_pdfs_in_folder(pdf_folder):
-    """Iterates through all PDFs in the folder and processes them."""
+def summary_path(pdf_path):
+    """Returns the path of the structured summary JSON for a PDF."""
+    return os.path.join(SUMMARY_FOLDER, os.path.basename(pdf_path).replace(".pdf", ".json"))
+
+def process_all_pdfs_in_folder(pdf_folder, refresh=False):
+    """Iterates through all PDFs in the folder and processes the new or changed ones.
+    Pass refresh=True to wipe previous summaries and images and start from scratch."""
     pdf_files = [f for f in os.listdir(pdf_folder) if f.endswith(".pdf")]
 
+    if refresh:
+        refresh_output_folders()
+    else:
+        for folder in [OUTPUT_FOLDER, SUMMARY_FOLDER]:
+            os.makedirs(folder, exist_ok=True)
+
+    # Drop summaries of papers that are no longer in the folder, so the review only sees current papers
+    # (all of them when the folder has no PDFs, rather than leaving an earlier run's summaries behind)
+    pdf_paths = [os.path.join(pdf_folder, pdf_file) for pdf_file in pdf_files]
+    current = {os.path.basename(summary_path(pdf_path)) for pdf_path in pdf_paths}
+    for file_name in os.listdir(SUMMARY_FOLDER):
+        if file_name.endswith(".json") and file_name not in current:
+            os.remove(os.path.join(SUMMARY_FOLDER, file_name))
+
     if not pdf_files:
         print("⚠️ No PDF files found in the folder.")
         return
 
-    # **Refresh folders once before processing the first PDF**
-    refresh_output_folders()
-
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        generate_summary_report(pdf_path)
+    manifest = get_run_manifest()
+    pending = [p for p in pdf_paths if not manifest.is_done("summary", summary_path(p), file_hash(p))]
+    print(f"📄 {len(pdf_paths) - len(pending)} summaries up to date, {len(pending)} to generate.")
+
+    # Parse PDFs on all cores; each paper is handed to a summary thread as soon as its chunk has been parsed
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        futures = {}
+        for pdf_path, error in parse_pdfs_parallel(pending, include_tables=True):
+            if error:
+                print(f"❌ Could not parse {os.path.basename(pdf_path)}: {error}")
+                continue
+            futures[executor.submit(generate_summary_report, pdf_path)] = pdf_path
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Could not summarise {os.path.basename(futures[future])}: {e}")
+
+    cache = get_llm_scheduler().cache
+    if cache is not None and pending:
+        stats = cache.stats()
+        print(f"🗄️ LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate).")
 
 # Run for all PDFs in the folder
 #if __name__ == "__main__":
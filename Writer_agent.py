@@ -1,87 +1,196 @@
 import json
+import math
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# Load API key from .env file
-load_dotenv()
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-
-if not gemini_api_key:
-    raise ValueError("❌ GEMINI_API_KEY is not set in the .env file.")
-
-# Configure API Key
-genai.configure(api_key=gemini_api_key)
-
-def generate_literature_review():
-    """Generates a literature review using Gemini AI from extracted research summaries."""
-    
-    # Path to JSON files folder
-    json_folder = "./structured_summaries"
-    
-    if not os.path.exists(json_folder) or not os.listdir(json_folder):
-        print("⚠️ No structured summaries found. Skipping literature review.")
-        return
-
-    # Load and preprocess JSON files
-    all_papers = []
-    for file_name in os.listdir(json_folder):
+from llm_scheduler import PRIORITY_HIGH, estimate_tokens, get_llm_scheduler
+
+# Bump when the review prompts change, so cached responses to the old prompts are not reused
+SECTION_PROMPT_VERSION = "review-section-v2"
+INTRO_PROMPT_VERSION = "review-intro-v1"
+CLOSING_PROMPT_VERSION = "review-closing-v1"
+# Papers per thematic section and the most sections a review is split into
+PAPERS_PER_SECTION = 8
+MAX_SECTIONS = 12
+# Token budget of every prompt sent by the writer
+PROMPT_TOKEN_BUDGET = 6000
+# Characters of each section passed to the prompt that writes the introduction and conclusion
+SECTION_DIGEST_CHARS = 1200
+
+OUTPUT_FILE = "generated_literature_review.txt"
+
+def load_summaries(json_folder):
+    """Loads the structured summaries, keeping the fields the review uses."""
+    papers = []
+    for file_name in sorted(os.listdir(json_folder)):
         if file_name.endswith(".json"):
             file_path = os.path.join(json_folder, file_name)
             try:
                 with open(file_path, "r", encoding="utf-8") as file:
-                    data = json.load(file)
-                    all_papers.append(data)
+                    paper = json.load(file)
             except json.JSONDecodeError:
                 print(f"⚠️ Skipping '{file_name}' due to JSON parsing error.")
+                continue
+            papers.append({
+                "title": paper.get("title", "No Title"),
+                "authors": paper.get("authors", "Unknown Author"),
+                "year": paper.get("year", "Unknown Year"),
+                "doi": paper.get("doi", "No DOI"),
+                "summary": paper.get("summary", "No summary available."),
+            })
+    return papers
+
+def cluster_papers(papers):
+    """Groups papers by topic with k-means over embeddings of their title and summary.
+    Falls back to consecutive groups when the embedding model is unavailable."""
+    n_clusters = min(MAX_SECTIONS, math.ceil(len(papers) / PAPERS_PER_SECTION))
+    if n_clusters <= 1:
+        return [papers]
+    try:
+        from Knowledge_Graph import get_sentence_model
+        from vector_index import kmeans, normalize_rows
+
+        embeddings = get_sentence_model().encode(
+            [f"{paper['title']}\n{paper['summary']}" for paper in papers], convert_to_numpy=True
+        )
+        _, assignments = kmeans(normalize_rows(embeddings), n_clusters)
+    except (ImportError, OSError) as e:  # Model not installed or not downloadable
+        print(f"⚠️ Clustering papers by position ({e}).")
+        assignments = [i * n_clusters // len(papers) for i in range(len(papers))]
+
+    clusters = [[paper for paper, cluster in zip(papers, assignments) if cluster == c] for c in range(n_clusters)]
+    return [cluster for cluster in clusters if cluster]
+
+def fit_papers_to_budget(papers, token_budget=PROMPT_TOKEN_BUDGET):
+    """Splits papers into groups whose section prompt fits in the token budget, halving
+    groups that are too large. Only a single paper too long on its own is shortened."""
+    tokens = estimate_tokens(section_prompt(papers))
+    if tokens <= token_budget:
+        return [papers]
+    if len(papers) > 1:
+        middle = len(papers) // 2
+        return fit_papers_to_budget(papers[:middle], token_budget) + fit_papers_to_budget(papers[middle:], token_budget)
+
+    paper = papers[0]
+    while tokens > token_budget and paper["summary"]:
+        paper = dict(paper, summary=paper["summary"][:len(paper["summary"]) * token_budget // tokens])
+        tokens = estimate_tokens(section_prompt([paper]))
+    return [[paper]]
+
+def section_prompt(papers):
+    context_data = json.dumps(papers, indent=2, ensure_ascii=False)
+    return f"""
+    ### **Research Task: Write One Thematic Section of a Literature Review**
+    The papers below were grouped together because they share a research theme.
+
+    --- **Research Papers:** ---
+    {context_data}
 
-    if not all_papers:
-        print("⚠️ No valid research papers found in JSON files. Exiting process.")
-        return
+    --- **Instructions:** ---
+    Start with a short Markdown heading (###) naming the theme. Then synthesise the papers:
+    compare approaches, key findings and open problems, citing papers as (First Author, Year).
+    Only use the provided data.
+    """
 
-    # Extract relevant fields
-    processed_papers = [
-        {
-            "title": paper.get("title", "No Title"),
-            "authors": paper.get("authors", "Unknown Author"),
-            "year": paper.get("year", "Unknown Year"),
-            "doi": paper.get("doi", "No DOI"),
-            "summary": paper.get("summary", "No summary available."),
-        }
-        for paper in all_papers[:10]
-    ]
-
-    context_data = json.dumps(processed_papers, indent=2)
-
-    # Construct AI prompt
-    structured_prompt = f"""
-    ### **Research Task: Generate a High-Quality, Multi-Page Literature Review**
-    Generate a **3-4 page literature review** based on structured data extracted from research papers.
-
-    --- **Extracted Research Papers:** ---
-    {context_data}
+def introduction_prompt(clusters, n_papers):
+    themes = "\n".join(f"Theme {i + 1}: " + "; ".join(paper["title"] for paper in cluster)
+                       for i, cluster in enumerate(clusters))
+    themes = themes[:(PROMPT_TOKEN_BUDGET - 500) * 4]
+    return f"""
+    ### **Research Task: Introduce a Literature Review**
+    A literature review covers {n_papers} papers, grouped into the themes below (paper titles per theme).
 
-    --- **Follow this structure:** ---
-    1. **Introduction**
-    2. **Key Themes & Findings**
-    3. **Research Gaps & Future Directions**
-    4. **Conclusion**
-    5. **References (formatted citations)**
+    --- **Themes:** ---
+    {themes}
+
+    --- **Write, in Markdown:** ---
+    ## Introduction
+    (motivate the field and announce the themes)
 
     Only use the provided data.
     """
 
-    # Generate response using Gemini API
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(structured_prompt)
+def closing_prompt(sections, n_papers):
+    digests = "\n\n".join(section[:SECTION_DIGEST_CHARS] for section in sections)
+    digests = digests[:(PROMPT_TOKEN_BUDGET - 500) * 4]
+    return f"""
+    ### **Research Task: Conclude a Literature Review**
+    A literature review of {n_papers} papers has been written as the thematic sections excerpted below.
 
-        # Save output
-        output_file = "generated_literature_review.txt"
-        with open(output_file, "w", encoding="utf-8") as file:
-            file.write(response.text)
+    --- **Thematic Sections (excerpts):** ---
+    {digests}
 
-        print(f"✅ Literature review saved to: {output_file}")
+    --- **Write, in Markdown:** ---
+    ## Research Gaps & Future Directions
+    (across all themes)
+    ## Conclusion
 
+    Only use the provided data.
+    """
+
+def format_references(papers):
+    """References section built from the summaries' metadata, without an LLM call."""
+    lines = [f"- {paper['authors']} ({paper['year']}). {paper['title']}. DOI: {paper['doi']}" for paper in papers]
+    return "## References\n" + "\n".join(lines)
+
+def generate_literature_review_stream():
+    """Generates a literature review with Gemini from the extracted research summaries, yielding
+    Markdown pieces as soon as they are produced; the full review is saved to OUTPUT_FILE at the end.
+    Errors are raised to the caller, and OUTPUT_FILE is only replaced once the whole review is written.
+
+    Papers are clustered by topic and one section per cluster is written concurrently while the
+    introduction streams in; the sections follow in order, then the streamed gaps and conclusion.
+    Every prompt stays under PROMPT_TOKEN_BUDGET, so all papers are covered and generation time
+    grows with the number of clusters."""
+    # Path to JSON files folder
+    json_folder = "./structured_summaries"
+
+    if not os.path.exists(json_folder) or not os.listdir(json_folder):
+        print("⚠️ No structured summaries found. Skipping literature review.")
+        return
+
+    all_papers = load_summaries(json_folder)
+    if not all_papers:
+        print("⚠️ No valid research papers found in JSON files. Exiting process.")
+        return
+
+    review = []
+    try:
+        scheduler = get_llm_scheduler()
+        # Topic clusters too large for one prompt are written as several sections
+        clusters = [group for cluster in cluster_papers(all_papers) for group in fit_papers_to_budget(cluster)]
+        print(f"✍️ Writing {len(clusters)} thematic sections for {len(all_papers)} papers...")
+        futures = [scheduler.submit(section_prompt(cluster), PRIORITY_HIGH, template=SECTION_PROMPT_VERSION)
+                   for cluster in clusters]
+
+        for piece in scheduler.stream(introduction_prompt(clusters, len(all_papers)), template=INTRO_PROMPT_VERSION):
+            review.append(piece)
+            yield piece
+
+        sections = []
+        for future in futures:
+            sections.append(future.result().strip())
+            review.append(f"\n\n{sections[-1]}")
+            yield review[-1]
+
+        review.append("\n\n")
+        yield review[-1]
+        for piece in scheduler.stream(closing_prompt(sections, len(all_papers)), template=CLOSING_PROMPT_VERSION):
+            review.append(piece)
+            yield piece
+
+        review.append(f"\n\n{format_references(all_papers)}\n")
+        yield review[-1]
     except Exception as e:
         print(f"❌ Error generating literature review: {e}")
+        raise
+
+    # Save output; a failed run never replaces the previous review with a partial one
+    with open(OUTPUT_FILE + ".tmp", "w", encoding="utf-8") as file:
+        file.write("".join(review))
+    os.replace(OUTPUT_FILE + ".tmp", OUTPUT_FILE)
+
+    print(f"✅ Literature review saved to: {OUTPUT_FILE}")
+
+def generate_literature_review():
+    """Generates the literature review and saves it to OUTPUT_FILE without streaming it anywhere."""
+    for _ in generate_literature_review_stream():
+        pass
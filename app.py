@@ -1,16 +1,12 @@
 import streamlit as st
-from crewai import Agent, Task, Crew
 import requests
 import json
 import os
-import shutil
 import re
 from dotenv import load_dotenv
-from copy_files import copy_files
-from Referece_extractor_agent import process_pdfs_in_folder
-from Paper_downloader_Agent import download_papers_from_dois
-from Summariser_agent import process_all_pdfs_in_folder
-import Writer_agent
+from http_client import get_http_client
+from pdf_download import download_pdf_file, format_bytes
+from run_manifest import run_workspace
 
 # Load API key from .env file
 load_dotenv()
@@ -19,16 +15,11 @@ if not SERPERDEV_API_KEY:
     st.error("Please set the SERPERDEV_API_KEY in the .env file.")
     st.stop()
 
-pdf_folder = "selected_papers"
-if os.path.exists(pdf_folder):
-    shutil.rmtree(pdf_folder)
-os.makedirs(pdf_folder, exist_ok=True)
+# Seed papers downloaded in parallel
+SEED_DOWNLOAD_WORKERS = 6
 
-# Folder to save Total collected Papers
-target_folder = "./Collected_Papers"
-if os.path.exists(target_folder):
-    shutil.rmtree(target_folder)  # Refresh folder on every run
-os.makedirs(target_folder, exist_ok=True)
+# Number of citation levels to crawl from the selected papers
+CRAWL_DEPTH = 3
 
 # Function to sanitize filenames
 def sanitize_filename(filename):
@@ -42,7 +33,7 @@ def search_papers(query):
     url = "https://google.serper.dev/scholar"
     payload = json.dumps({"q": query})
     headers = {'X-API-KEY': SERPERDEV_API_KEY, 'Content-Type': 'application/json'}
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = get_http_client().post(url, headers=headers, data=payload)
     return response.json().get("organic", [])[:10]  # Limit to top 10 results
 
 def select_papers(search_results):
@@ -62,51 +53,79 @@ def select_papers(search_results):
     
     return selected_papers
 
-def download_pdf(selected_papers):
+def seed_filenames(papers, pdf_folder):
+    """Returns a distinct PDF path per paper; titles that sanitize to the same name get _2, _3, ..."""
+    filenames, taken = [], set()
+    for paper in papers:
+        title_cleaned = sanitize_filename(paper["title"]).replace(" ", "_").replace("/", "-")
+        stem, suffix = title_cleaned, 1
+        while stem.lower() in taken:
+            suffix += 1
+            stem = f"{title_cleaned}_{suffix}"
+        taken.add(stem.lower())
+        filenames.append(os.path.join(pdf_folder, f"{stem}.pdf"))
+    return filenames
+
+def download_seed_paper(paper, filename):
+    """Downloads one selected paper; runs on a worker thread, so it must not call Streamlit."""
+    try:
+        # The GET response's Content-Type decides if this is a direct PDF link (no HEAD round-trip)
+        stats = download_pdf_file(paper["pdfUrl"], filename, headers={'User-Agent': 'Mozilla/5.0'},
+                                  require_pdf_type=True)
+        return filename, stats, None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return filename, None, e
+
+def download_pdf(selected_papers, pdf_folder):
+    """Downloads the selected papers concurrently and reports each one as soon as it finishes."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    papers = [paper for paper in selected_papers if paper.get("pdfUrl")]
+    if not papers:
+        return []
     failed_downloads = []
-    for paper in selected_papers:
-        pdf_url = paper.get("pdfUrl")
-        if pdf_url:
-            title_cleaned = sanitize_filename(paper["title"]).replace(" ", "_").replace("/", "-")
-            filename = os.path.join(pdf_folder, f"{title_cleaned}.pdf")
-            try:
-                response = requests.head(pdf_url, allow_redirects=True, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-                content_type = response.headers.get('Content-Type', '')
-                if 'application/pdf' in content_type or pdf_url.endswith('.pdf'):
-                    response = requests.get(pdf_url, stream=True, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-                    response.raise_for_status()
-                    with open(filename, "wb") as file:
-                        for chunk in response.iter_content(1024):
-                            file.write(chunk)
-                    st.success(f"✅ Downloaded: {filename}")
-                else:
-                    raise ValueError("Not a direct PDF link")
-            except (requests.exceptions.RequestException, ValueError) as e:
-                st.error(f"❌ Failed to download {filename}: {e}")
-                failed_downloads.append(pdf_url)
+    progress_bar = st.progress(0.0, text=f"Downloading {len(papers)} papers...")
+    with ThreadPoolExecutor(max_workers=min(SEED_DOWNLOAD_WORKERS, len(papers))) as executor:
+        futures = {executor.submit(download_seed_paper, paper, filename): paper
+                   for paper, filename in zip(papers, seed_filenames(papers, pdf_folder))}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            filename, stats, error = future.result()
+            if error is None:
+                st.success(f"✅ Downloaded: {filename} ({format_bytes(stats['bytes'])}, "
+                           f"{format_bytes(stats['bytes_per_sec'])}/s)")
+            else:
+                st.error(f"❌ Failed to download {filename}: {error}")
+                failed_downloads.append(futures[future]["pdfUrl"])
+            progress_bar.progress(finished / len(papers), text=f"Downloaded {finished}/{len(papers)} papers")
     return failed_downloads
 
-# Define Agents without LLM dependencies
-search_agent = Agent(
-    name="Search Agent",
-    role="Researcher",
-    goal="Finds relevant academic papers from Google Scholar.",
-    backstory="An expert in academic research, dedicated to discovering valuable sources."
-)
-
-selection_agent = Agent(
-    name="Selection Agent",
-    role="Evaluator",
-    goal="Helps users manually select the most relevant papers.",
-    backstory="A meticulous reviewer who ensures only the best papers are chosen."
-)
-
-download_agent = Agent(
-    name="Download Agent",
-    role="Downloader",
-    goal="Ensures selected papers are downloaded and organized properly.",
-    backstory="A diligent archivist focused on preserving academic papers."
-)
+# Define Agents without LLM dependencies (crewai is imported and the agents built only when a crawl starts)
+@st.cache_resource
+def get_crew_agents():
+    from crewai import Agent
+
+    search_agent = Agent(
+        name="Search Agent",
+        role="Researcher",
+        goal="Finds relevant academic papers from Google Scholar.",
+        backstory="An expert in academic research, dedicated to discovering valuable sources."
+    )
+
+    selection_agent = Agent(
+        name="Selection Agent",
+        role="Evaluator",
+        goal="Helps users manually select the most relevant papers.",
+        backstory="A meticulous reviewer who ensures only the best papers are chosen."
+    )
+
+    download_agent = Agent(
+        name="Download Agent",
+        role="Downloader",
+        goal="Ensures selected papers are downloaded and organized properly.",
+        backstory="A diligent archivist focused on preserving academic papers."
+    )
+
+    return search_agent, selection_agent, download_agent
 
 # Streamlit UI
 st.title("Deep Research Agentic Bot")
@@ -122,7 +141,24 @@ if st.button("Search"):
 if "search_results" in st.session_state:
     selected_papers = select_papers(st.session_state["search_results"])
     if st.button("Download Selected Papers"):
-        failed_downloads = download_pdf(selected_papers)
+        # Heavy agent modules are only imported once the user actually starts the pipeline
+        get_crew_agents()
+        from copy_files import copy_files
+        from crawl_engine import crawl_citations
+        from Summariser_agent import process_all_pdfs_in_folder
+        import Writer_agent
+
+        # Each selection runs in its own workspace, so papers of earlier queries never leak into this one;
+        # finished work is tracked in the run manifest, so rerunning the same selection only processes new papers
+        workspace = run_workspace(paper["pdfUrl"] for paper in selected_papers if paper.get("pdfUrl"))
+        pdf_folder = os.path.join(workspace, "selected_papers")
+        target_folder = os.path.join(workspace, "Collected_Papers")
+        references_folder = os.path.join(workspace, "references_json")
+        download_folder = os.path.join(workspace, "downloaded_papers")
+        for folder in [pdf_folder, target_folder]:
+            os.makedirs(folder, exist_ok=True)
+
+        failed_downloads = download_pdf(selected_papers, pdf_folder)
         if failed_downloads:
             #st.warning("❌ Some PDFs could not be downloaded:")
             for url in failed_downloads:
@@ -130,65 +166,40 @@ if "search_results" in st.session_state:
         st.success("📂 All available PDFs have been downloaded.")
         
         # Copy Selected intial papers to Collected_Papers
-        copy_files("./selected_papers", "./Collected_Papers")
+        copy_files(pdf_folder, target_folder)
         st.success("📂 Intially Selected Papers successfully moved to Collected_Papers(root) folder.")
 
-        #if no files in selected_papers folder then the next steps will not be executed
-        if os.listdir("./selected_papers") == []:
+        #if no PDFs in selected_papers folder then the next steps will not be executed (failed downloads leave .part files)
+        if not any(file_name.endswith(".pdf") for file_name in os.listdir(pdf_folder)):
             st.error("❌ No PDFs found in the selected_papers folder. Please select papers and try again or the papers you have selected are behind the pay wall.")
         else:
         
-            # Level 1: Calling Reference Extractor
-            process_pdfs_in_folder("./selected_papers", "./references_json")
-            st.success("📄 Level 1: References extracted and saved in references_json folder.")
-            
-            # Level 1: Calling to download all the PDFs
-            download_papers_from_dois("./references_json", "./downloaded_papers")
-            st.success("📄 Level 1: Papers downloaded using extracted DOIs and saved in downloaded_papers folder.")
-
-            # Level 1: Copy downloaded papers to Collected_Papers
-            copy_files("./downloaded_papers", "./Collected_Papers")
-            st.success("📂 Level 1: Extracted Papers successfully moved to Collected_Papers(root) folder.")
-
-            # Level 2: Calling Reference Extractor
-            process_pdfs_in_folder("./downloaded_papers", "./references_json")
-            st.success("📄 Level 2: References extracted and saved in references_json folder.")
-            
-            # Level 2: Calling to download all the PDFs
-            download_papers_from_dois("./references_json", "./downloaded_papers")
-            st.success("📄 Level 2: Papers downloaded using extracted DOIs and saved in downloaded_papers folder.")
-
-            # Level 2: Copy downloaded papers to Collected_Papers
-            copy_files("./downloaded_papers", "./Collected_Papers")
-            st.success("📂 Level 2: Extracted Papers successfully moved to Collected_Papers(root) folder.")
-
-            # Level 3: Calling Reference Extractor
-            process_pdfs_in_folder("./downloaded_papers", "./references_json")
-            st.success("📄 Level 3: References extracted and saved in references_json folder.")
-            
-            # Level 3: Calling to download all the PDFs
-            download_papers_from_dois("./references_json", "./downloaded_papers")
-            st.success("📄 Level 3: Papers downloaded using extracted DOIs and saved in downloaded_papers folder.")
-
-            # Level 3: Copy downloaded papers to Collected_Papers
-            copy_files("./downloaded_papers", "./Collected_Papers")
-            st.success("📂 Level 3: Extracted Papers successfully moved to Collected_Papers(root) folder.")
+            # Levels 1-3: crawl references, download cited papers and collect them concurrently
+            crawl_stats = crawl_citations(pdf_folder, max_depth=CRAWL_DEPTH,
+                                          references_folder=references_folder,
+                                          download_folder=download_folder,
+                                          collected_folder=target_folder)
+            for level, stats in sorted(crawl_stats.items()):
+                st.success(f"📄 Level {level}: {stats['papers_processed']} papers processed, "
+                           f"{stats['dois_found']} DOIs extracted, {stats['papers_downloaded']} papers downloaded "
+                           "and moved to Collected_Papers(root) folder.")
 
             # Summarize all the papers
-            process_all_pdfs_in_folder("./Collected_Papers")
+            process_all_pdfs_in_folder(target_folder)
             st.success("📄 Papers summarized and saved in summary folder.")
 
-            # Generate Literature Review
-            Writer_agent.generate_literature_review()
-            st.success("📄 Literature review generated and saved in the root folder.")
-
-            # Display the generated literature review in Streamlit
-            output_file = "generated_literature_review.txt"
-            if os.path.exists(output_file):
-                with open(output_file, "r", encoding="utf-8") as file:
-                    literature_review_content = file.read()
-                
-                st.subheader("📜 Generated Literature Review")
-                st.markdown(literature_review_content, unsafe_allow_html=True)  # Display formatted text
+            # Generate the literature review, rendering it in Streamlit as it is written
+            st.subheader("📜 Generated Literature Review")
+            review_placeholder = st.empty()
+            literature_review_content = ""
+            try:
+                for piece in Writer_agent.generate_literature_review_stream():
+                    literature_review_content += piece
+                    review_placeholder.markdown(literature_review_content, unsafe_allow_html=True)  # Display formatted text
+            except Exception as e:
+                st.error(f"❌ Literature review generation failed: {e}")
             else:
-                st.error("❌ Literature review file not found. Please check the generation process.")
+                if os.path.exists(Writer_agent.OUTPUT_FILE) and literature_review_content:
+                    st.success("📄 Literature review generated and saved in the root folder.")
+                else:
+                    st.error("❌ Literature review file not found. Please check the generation process.")
@@ -0,0 +1,184 @@
+import json
+import os
+import numpy as np
+from vector_index import ANN_THRESHOLD, VectorIndex, normalize_rows, top_k_indices
+
+# Characters per chunk and characters shared by consecutive chunks
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Chunks encoded per model call while indexing, and rows scored per block while searching
+ENCODE_GROUP_SIZE = 1024
+SEARCH_BLOCK_ROWS = 65_536
+
+def chunk_pages(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Splits a document's pages into overlapping character windows; returns (text, page number) pairs.
+    A chunk's page is the page its first character comes from."""
+    text = ""
+    page_starts = []
+    for page_text in pages:
+        page_starts.append(len(text))
+        text += page_text + "\n"
+
+    chunks = []
+    step = max(1, chunk_size - overlap)
+    for start in range(0, len(text), step):
+        chunk = text[start:start + chunk_size].strip()
+        if chunk:
+            page = int(np.searchsorted(page_starts, start, side="right"))
+            chunks.append((chunk, page))
+        if start + chunk_size >= len(text):
+            break
+    return chunks
+
+class ChunkIndex:
+    """
+    Embeddings of overlapping full-text chunks, stored as one L2-normalized float16
+    matrix (half the memory of float32; memory-mapped when loaded) plus one
+    {hash, page} record per row. Chunks are keyed by PDF content hash, so an update
+    only encodes papers that were added or changed, and files with identical content
+    share one set of rows. Searches score the matrix block by block in float32 and
+    aggregate chunk hits to papers by their best chunk.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.chunks_path = os.path.join(folder, "chunks.json")
+        self.embeddings_path = os.path.join(folder, "chunk_embeddings.npy")
+        self.chunks = []
+        self.papers = {}  # paper name -> content hash
+        self.matrix = np.empty((0, 0), dtype=np.float16)
+        self._hash_rows = {}
+        self._names_by_hash = {}
+        self._ann = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, name):
+        """True if the paper has chunk rows (a PDF whose text is only whitespace has none)."""
+        return self.papers.get(name) in self._hash_rows
+
+    def _index_rows(self):
+        """Maps each content hash to its contiguous (start, end) row range and to the papers sharing it."""
+        self._hash_rows = {}
+        for row, chunk in enumerate(self.chunks):
+            start, _ = self._hash_rows.get(chunk["hash"], (row, row))
+            self._hash_rows[chunk["hash"]] = (start, row + 1)
+        self._names_by_hash = {}
+        for name, content_hash in self.papers.items():
+            self._names_by_hash.setdefault(content_hash, []).append(name)
+        # Large indexes are searched approximately through IVF lists over the chunk rows
+        self._ann = None
+        if len(self.chunks) > ANN_THRESHOLD:
+            self._ann = VectorIndex(use_ann=True)
+            self._ann.build(range(len(self.chunks)), self.matrix, normalized=True)
+
+    def load(self, model_name):
+        """Loads the saved chunks for this model; returns False if there is nothing usable."""
+        if not (os.path.exists(self.chunks_path) and os.path.exists(self.embeddings_path)):
+            return False
+        try:
+            with open(self.chunks_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            matrix = np.load(self.embeddings_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable chunk index: {e}")
+            return False
+        if saved.get("model") != model_name or len(matrix) != len(saved["chunks"]):
+            return False
+        self.chunks, self.matrix = saved["chunks"], matrix
+        # Indexes saved before papers were recorded named one paper per chunk
+        self.papers = saved.get("papers") or {chunk["paper"]: chunk["hash"] for chunk in self.chunks if "paper" in chunk}
+        self._index_rows()
+        return True
+
+    def save(self, model_name):
+        """Atomically replaces the saved chunk matrix and records."""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.embeddings_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float16))
+        with open(self.chunks_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "papers": self.papers, "chunks": self.chunks}, f)
+        os.replace(self.embeddings_path + ".tmp", self.embeddings_path)
+        os.replace(self.chunks_path + ".tmp", self.chunks_path)
+
+    def update(self, papers, load_pages, encode):
+        """Makes the index match the given papers ({"name", "hash", ...} dicts).
+        Chunks of unchanged papers are kept; load_pages(paper) and encode(texts) are only
+        called for new or changed content. Returns the number of newly encoded chunks."""
+        current = {paper["hash"] for paper in papers}
+        kept = [row for row, chunk in enumerate(self.chunks) if chunk["hash"] in current]
+        chunks = [{"hash": self.chunks[row]["hash"], "page": self.chunks[row]["page"]} for row in kept]
+        blocks = [np.asarray(self.matrix[kept], dtype=np.float16)] if kept else []
+
+        indexed = {chunk["hash"] for chunk in chunks}
+        pending_texts = []
+        encoded = 0
+        for paper in papers:
+            if paper["hash"] in indexed:
+                continue  # Unchanged, or a copy of a file already indexed
+            indexed.add(paper["hash"])
+            for text, page in chunk_pages(load_pages(paper)):
+                chunks.append({"hash": paper["hash"], "page": page})
+                pending_texts.append(text)
+            if len(pending_texts) >= ENCODE_GROUP_SIZE:
+                blocks.append(normalize_rows(encode(pending_texts)).astype(np.float16))
+                encoded += len(pending_texts)
+                pending_texts = []
+        if pending_texts:
+            blocks.append(normalize_rows(encode(pending_texts)).astype(np.float16))
+            encoded += len(pending_texts)
+
+        # Chunks of one hash stay contiguous: kept rows keep their order, new content is appended whole
+        self.chunks = chunks
+        self.papers = {paper["name"]: paper["hash"] for paper in papers}
+        self.matrix = np.vstack(blocks) if blocks else np.empty((0, 0), dtype=np.float16)
+        self._index_rows()
+        return encoded
+
+    def paper_vectors(self, names):
+        """Paper-level embeddings: the normalized mean of each paper's chunk vectors."""
+        if not names:
+            return np.empty((0, self.matrix.shape[1]), dtype=np.float32)
+        vectors = [
+            np.asarray(self.matrix[slice(*self._hash_rows[self.papers[name]])], dtype=np.float32).mean(axis=0)
+            for name in names
+        ]
+        return normalize_rows(np.array(vectors, dtype=np.float32).reshape(len(names), -1))
+
+    def search(self, queries, top_k=5, chunks_per_paper=4):
+        """Returns, for each query vector, a list of (paper, score, page) triples, best first.
+        A paper scores as its best chunk; page is where that chunk starts. The chunks
+        considered start at top_k * chunks_per_paper and double until top_k papers are found.
+        Up to ANN_THRESHOLD chunks the search is exact; above it, it runs on IVF lists."""
+        queries = normalize_rows(queries)
+        if not self.chunks:
+            return [[] for _ in range(len(queries))]
+
+        if self._ann is None:
+            scores = np.empty((len(queries), len(self.chunks)), dtype=np.float32)
+            for start in range(0, len(self.chunks), SEARCH_BLOCK_ROWS):
+                block = np.asarray(self.matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                scores[:, start:start + len(block)] = queries @ block.T
+
+            def best_chunks(row, n):
+                return [(i, float(scores[row, i])) for i in top_k_indices(scores[row:row + 1], n)[0]]
+        else:
+            def best_chunks(row, n):
+                return self._ann.search(queries[row:row + 1], n)[0]
+
+        results = []
+        for row in range(len(queries)):
+            n_chunks = top_k * chunks_per_paper
+            while True:
+                ranked = best_chunks(row, n_chunks)
+                hits = {}
+                for i, score in ranked:
+                    for paper in self._names_by_hash.get(self.chunks[i]["hash"], ()):
+                        if paper not in hits:
+                            hits[paper] = (paper, score, self.chunks[i]["page"])
+                if len(hits) >= top_k or len(ranked) < n_chunks:
+                    break  # Enough papers, or no more chunks to consider
+                n_chunks *= 2
+            results.append(list(hits.values())[:top_k])
+        return results
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import shutil
+from Referece_extractor_agent import extract_references_from_pdf
+from Paper_downloader_Agent import PaperDownloader
+from crawl_frontier import CrawlFrontier, normalize_doi
+from pdf_store import get_pdf_store, parse_into_store, parse_pool
+
+class CitationCrawler:
+    """
+    Asynchronous citation crawler. Each paper flows through
+    reference extraction -> CrossRef resolution -> open-access lookup -> download
+    on its own, so deeper levels start as soon as their parent paper is ready
+    instead of waiting for the whole previous level to finish.
+    Reference extraction is checkpointed in the run manifest and DOIs in the frontier,
+    so an interrupted or repeated crawl only does the work that is still missing.
+    """
+
+    def __init__(self, references_folder="./references_json", download_folder="./downloaded_papers",
+                 collected_folder="./Collected_Papers", max_depth=3, max_concurrency=8, frontier=None):
+        self.references_folder = references_folder
+        self.download_folder = download_folder
+        self.collected_folder = collected_folder
+        self.max_depth = max_depth
+        self.max_concurrency = max_concurrency
+        self.stats = {}
+        self._scheduled = set()  # DOIs and PDFs already queued during this run
+        # The frontier lives with the corpus, so a DOI is resolved at most once per Collected_Papers folder
+        self.frontier = frontier or CrawlFrontier(os.path.join(collected_folder, ".crawl_frontier"))
+
+    def _level_stats(self, level):
+        """Returns the counters for a citation level, creating them on first use."""
+        return self.stats.setdefault(level, {"papers_processed": 0, "dois_found": 0, "papers_downloaded": 0})
+
+    @staticmethod
+    def _downloaded_path(doi, output_folder):
+        """Returns the path of a downloaded paper (open-access or Sci-Hub), if any."""
+        base_name = doi.replace("/", "_")
+        for filename in (f"{base_name}.pdf", f"{base_name}_scihub.pdf"):
+            file_path = os.path.join(output_folder, filename)
+            if os.path.exists(file_path):
+                return file_path
+        return None
+
+    def _fetch_paper(self, doi, pdf_url):
+        """Downloads a DOI from its open-access URL, falling back to Sci-Hub (blocking)."""
+        success = False
+        if pdf_url:
+            success = PaperDownloader.download_paper(doi, pdf_url, self.download_folder)
+        if not success:
+            PaperDownloader.fallback_to_scihub(doi, self.download_folder)
+
+        file_path = self._downloaded_path(doi, self.download_folder)
+        if file_path:
+            shutil.copy2(file_path, os.path.join(self.collected_folder, os.path.basename(file_path)))
+        return file_path
+
+    async def _process_pdf(self, queue, pdf_path, level):
+        """Extracts and resolves the references of one paper and queues their downloads."""
+        # CPU-bound parsing runs in a worker process so it doesn't hold the GIL for the network stages
+        loop = asyncio.get_running_loop()
+        [(_, error)] = await loop.run_in_executor(self._parse_pool, parse_into_store, [pdf_path], False, get_pdf_store().folder)
+        if error:
+            raise RuntimeError(f"could not parse PDF: {error}")
+
+        references = await asyncio.to_thread(
+            extract_references_from_pdf, pdf_path, output_folder=self.references_folder
+        )
+        stats = self._level_stats(level)
+        stats["papers_processed"] += 1
+
+        # Skip "Not Found"/"Error: ..." placeholders and DOIs already queued in this run
+        dois = []
+        for entry in references:
+            if not entry.get("DOI", "").startswith("10."):
+                continue
+            doi = normalize_doi(entry["DOI"])
+            if doi in self._scheduled:
+                continue
+            self._scheduled.add(doi)
+            if doi in self.frontier:
+                # Looked up in an earlier run: don't fetch again, but keep following its references
+                file_path = self._downloaded_path(doi, self.download_folder)
+                if file_path and level < self.max_depth:
+                    self._queue_pdf(queue, file_path, level + 1)
+                continue
+            dois.append(doi)
+        stats["dois_found"] += len(dois)
+
+        # Resolve the whole reference list in a few batched requests, then download each paper
+        pdf_urls = await asyncio.to_thread(PaperDownloader.batch_search_open_access, dois)
+        for doi in dois:
+            queue.put_nowait(("doi", (doi, pdf_urls.get(doi)), level))
+
+    async def _process_doi(self, queue, doi, pdf_url, level):
+        """Downloads one cited paper and, below the depth limit, queues it for extraction."""
+        file_path = await asyncio.to_thread(self._fetch_paper, doi, pdf_url)
+        self.frontier.add(doi)  # Only after the attempt, so an interrupted crawl retries this DOI
+        if not file_path:
+            return
+
+        self._level_stats(level)["papers_downloaded"] += 1
+        if level < self.max_depth:
+            self._queue_pdf(queue, file_path, level + 1)
+
+    def _queue_pdf(self, queue, pdf_path, level):
+        """Queues a PDF for reference extraction unless it is already queued in this run."""
+        if pdf_path not in self._scheduled:
+            self._scheduled.add(pdf_path)
+            queue.put_nowait(("pdf", pdf_path, level))
+
+    async def _worker(self, queue):
+        """Pulls jobs off the shared queue until the crawl is cancelled."""
+        while True:
+            kind, item, level = await queue.get()
+            try:
+                if kind == "pdf":
+                    await self._process_pdf(queue, item, level)
+                else:
+                    await self._process_doi(queue, *item, level)
+            except Exception as e:
+                print(f"❌ Crawl error at level {level} for {item}: {e}")
+            finally:
+                queue.task_done()
+
+    async def crawl(self, seed_folder):
+        """Crawls the citation graph starting from every PDF in seed_folder."""
+        for folder in [self.references_folder, self.download_folder, self.collected_folder]:
+            os.makedirs(folder, exist_ok=True)
+
+        self._parse_pool = parse_pool()
+        try:
+            queue = asyncio.Queue()
+            for pdf_file in sorted(os.listdir(seed_folder)):
+                if pdf_file.endswith(".pdf"):
+                    self._queue_pdf(queue, os.path.join(seed_folder, pdf_file), 1)
+
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.max_concurrency)]
+            try:
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            self._parse_pool.shutdown(cancel_futures=True)
+
+        return self.stats
+
+def crawl_citations(seed_folder="./selected_papers", max_depth=3, max_concurrency=8,
+                    references_folder="./references_json", download_folder="./downloaded_papers",
+                    collected_folder="./Collected_Papers", frontier=None):
+    """Runs the citation crawl to the given depth and returns per-level statistics."""
+    crawler = CitationCrawler(references_folder, download_folder, collected_folder,
+                              max_depth=max_depth, max_concurrency=max_concurrency, frontier=frontier)
+    try:
+        return asyncio.run(crawler.crawl(seed_folder))
+    finally:
+        if frontier is None:
+            crawler.frontier.close()
+
+# Example Usage:
+# crawl_citations("./selected_papers", max_depth=3)
@@ -0,0 +1,83 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from array import array
+
+DOI_PREFIXES = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+
+def normalize_doi(doi):
+    """Normalizes a DOI so the same work always maps to the same key (DOIs are case-insensitive)."""
+    doi = DOI_PREFIXES.sub("", doi.strip())
+    doi = doi.split("/table")[0]  # Drop table/figure suffixes, as PaperDownloader.clean_doi does
+    return doi.strip().rstrip(".,;").lower()
+
+def doi_hash(doi):
+    """Returns a 64-bit hash of a normalized DOI."""
+    return int.from_bytes(hashlib.blake2b(doi.encode("utf-8"), digest_size=8).digest(), "little")
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit hashes, for crawls too large for an exact visited set."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, value):
+        """Derives the bit positions of a hash with double hashing."""
+        h1, h2 = value & 0xFFFFFFFF, (value >> 32) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+class CrawlFrontier:
+    """
+    Visited set of DOIs shared by every level of a crawl and persisted between runs.
+    DOIs are stored as 64-bit hashes in an append-only file; pass bloom_capacity to
+    keep them in a Bloom filter instead when the corpus is very large.
+    """
+
+    def __init__(self, path, bloom_capacity=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._visited = BloomFilter(bloom_capacity) if bloom_capacity else set()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            hashes = array("Q")
+            with open(path, "r+b") as f:
+                data = f.read()
+                usable = len(data) - len(data) % hashes.itemsize
+                if usable < len(data):
+                    # A write was interrupted mid-record: drop the torn tail so appends stay aligned
+                    f.truncate(usable)
+                hashes.frombytes(data[:usable])
+            for value in hashes:
+                self._visited.add(value)
+        self._file = open(path, "ab")
+
+    def __contains__(self, doi):
+        return doi_hash(normalize_doi(doi)) in self._visited
+
+    def add(self, doi):
+        """Marks a DOI as visited. Returns False if it had already been visited."""
+        value = doi_hash(normalize_doi(doi))
+        with self._lock:
+            if value in self._visited:
+                return False
+            self._visited.add(value)
+            self._file.write(array("Q", [value]).tobytes())
+            self._file.flush()
+        return True
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,125 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Default location and limits of the on-disk DOI cache
+DOI_CACHE_PATH = "./cache/doi_cache.sqlite"
+POSITIVE_TTL = 30 * 24 * 3600  # Resolved DOIs are stable, keep them for 30 days
+NEGATIVE_TTL = 24 * 3600  # "Not Found" answers may change as CrossRef grows, retry after a day
+MAX_ENTRIES = 200_000
+# Cache hits whose access times are held in memory before being written in one transaction
+ACCESS_FLUSH_EVERY = 256
+
+class DOICache:
+    """
+    SQLite-backed cache of CrossRef lookups keyed by the normalized reference string.
+    Entries expire after a TTL (shorter for negative results) and the least recently
+    used entries are evicted once the cache grows past max_entries. Hits only record
+    their access time in memory; the times are written in batches, so reads cost no commit.
+    """
+
+    def __init__(self, path=DOI_CACHE_PATH, ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._accessed = {}  # key -> last access time not yet written
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # With WAL: no fsync per commit, still crash-safe
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS doi_cache (
+                   key TEXT PRIMARY KEY,
+                   doi TEXT,
+                   expires_at REAL NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_doi_cache_access ON doi_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(reference):
+        """Normalizes a reference string so formatting differences map to the same key."""
+        reference = reference.lower()
+        reference = re.sub(r"^\s*\[?\d+[\].)]?\s+", "", reference)  # Drop leading "[12]" / "12." numbering
+        reference = re.sub(r"[^\w\s]", " ", reference)
+        return re.sub(r"\s+", " ", reference).strip()
+
+    def get(self, reference):
+        """Returns (hit, doi) for a reference; doi is None for a cached negative result."""
+        key = self.normalize(reference)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT doi, expires_at FROM doi_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM doi_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return False, None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_EVERY:
+                self._flush_access_times()
+                self._conn.commit()
+        return True, row[0]
+
+    def _flush_access_times(self):
+        """Writes the buffered access times (the caller holds the lock and commits)."""
+        if self._accessed:
+            self._conn.executemany("UPDATE doi_cache SET last_access = ? WHERE key = ?",
+                                   [(when, key) for key, when in self._accessed.items()])
+            self._accessed = {}
+
+    def set(self, reference, doi):
+        """Stores a lookup result; pass doi=None to record a negative result."""
+        key = self.normalize(reference)
+        now = time.time()
+        ttl = self.ttl if doi else self.negative_ttl
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO doi_cache (key, doi, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, doi, now + ttl, now),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 1000:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones above max_entries."""
+        self._writes_since_evict = 0
+        self._flush_access_times()
+        self._conn.execute("DELETE FROM doi_cache WHERE expires_at < ?", (time.time(),))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM doi_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM doi_cache WHERE key IN (SELECT key FROM doi_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def close(self):
+        """Writes pending access times and closes the underlying database connection."""
+        with self._lock:
+            self._flush_access_times()
+            self._conn.commit()
+            self._conn.close()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_doi_cache():
+    """Returns the process-wide DOI cache, opening it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DOICache(os.getenv("DOI_CACHE_PATH", DOI_CACHE_PATH))
+    return _default_cache
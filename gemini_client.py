@@ -0,0 +1,20 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Gemini model used by the summariser and the literature-review writer
+GEMINI_MODEL = "gemini-2.0-flash"
+
+@lru_cache(maxsize=None)
+def get_gemini_model(model_name=GEMINI_MODEL):
+    """Imports and configures the Gemini SDK on first use and returns a cached model handle."""
+    import google.generativeai as genai  # Heavy import: only paid by pages that call the LLM
+
+    # Load API key from .env file
+    load_dotenv()
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("❌ GEMINI_API_KEY is not set in the .env file.")
+
+    genai.configure(api_key=gemini_api_key)
+    return genai.GenerativeModel(model_name)
@@ -0,0 +1,112 @@
+import email.utils
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import throttle
+
+# Status codes that are worth retrying (rate limiting and transient server errors)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RequestsTransport:
+    """Default transport: one requests.Session with per-host keep-alive connection pools."""
+
+    def __init__(self, pool_connections=32, pool_maxsize=64):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+class HttpClient:
+    """
+    Shared HTTP client for all agents. Requests go through a pluggable transport
+    (pooled keep-alive sessions by default), wait for the per-host rate limiter and
+    are retried with exponential backoff and full jitter, honoring Retry-After.
+    Tests can pass any object with a send(method, url, **kwargs) method as transport.
+    """
+
+    def __init__(self, transport=None, max_retries=3, backoff_base=0.5, backoff_cap=30.0,
+                 retry_statuses=RETRY_STATUSES, rate_limit=True):
+        self.transport = transport or RequestsTransport()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_statuses = retry_statuses
+        self.rate_limit = rate_limit
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff delay for the given attempt number."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        """Returns the delay requested by a Retry-After header (seconds or HTTP date), if any."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.backoff_cap, max(0.0, delay))
+
+    def request(self, method, url, max_retries=None, **kwargs):
+        """Sends a request, retrying connection errors and retryable status codes."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            if self.rate_limit:
+                throttle(url)
+            try:
+                response = self.transport.send(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in self.retry_statuses and attempt < max_retries:
+                delay = self._retry_after(response)
+                response.close()
+                time.sleep(delay if delay is not None else self._backoff(attempt))
+                continue
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        close = getattr(self.transport, "close", None)
+        if close:
+            close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """Returns the process-wide HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+    return _client
+
+def set_http_client(client):
+    """Replaces the process-wide HTTP client (e.g. with one using a local test transport)."""
+    global _client
+    with _client_lock:
+        _client = client
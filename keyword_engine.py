@@ -0,0 +1,146 @@
+import os
+import re
+from functools import lru_cache
+import nltk
+import numpy as np
+from scipy import sparse
+
+# NLTK resources used for keyword extraction: (nltk.data path, download id)
+NLTK_RESOURCES = [("corpora/stopwords", "stopwords")]
+
+# Alphanumeric runs, the same tokens word_tokenize + isalnum() kept, without the per-call tokenizer cost
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+def nltk_resource_available(path):
+    try:
+        nltk.data.find(path)
+        return True
+    except LookupError:
+        return False
+
+@lru_cache(maxsize=None)
+def ensure_nltk_resources():
+    """Downloads missing NLTK resources once per process; no network I/O when they are installed."""
+    for path, resource in NLTK_RESOURCES:
+        if not nltk_resource_available(path):
+            nltk.download(resource, quiet=True)
+
+@lru_cache(maxsize=None)
+def get_stopwords(language="english"):
+    """Returns the stopword set, built once per process."""
+    ensure_nltk_resources()
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words(language))
+
+def tokenize(text):
+    """Lowercases and splits text into alphanumeric tokens, dropping stopwords."""
+    stop_words = get_stopwords()
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in stop_words]
+
+class KeywordEngine:
+    """
+    Corpus-level keyword extraction. Every document is tokenized once into a sparse
+    document-term matrix (CSR); term weights are then computed for the whole corpus
+    at once with TF-IDF or BM25, and each document keeps its top-weighted terms.
+    """
+
+    def __init__(self, weighting="tfidf", k1=1.5, b=0.75):
+        if weighting not in ("tfidf", "bm25"):
+            raise ValueError(f"Unknown weighting: {weighting}")
+        self.weighting = weighting
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.terms = []
+        self.counts = None
+        self.idf = None
+
+    def fit(self, texts):
+        """Builds the document-term matrix and the corpus statistics."""
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            terms, term_counts = np.unique(
+                [self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokenize(text)],
+                return_counts=True,
+            )
+            indices.extend(terms.tolist())
+            data.extend(term_counts.tolist())
+            indptr.append(len(indices))
+
+        self.terms = list(self.vocabulary)
+        self.counts = sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.vocabulary)),
+        )
+        n_docs = self.counts.shape[0]
+        doc_freq = np.bincount(self.counts.indices, minlength=len(self.vocabulary))
+        if self.weighting == "bm25":
+            self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        else:
+            self.idf = (np.log((1 + n_docs) / (1 + doc_freq)) + 1).astype(np.float32)
+        return self
+
+    def save(self, path):
+        """Saves the fitted vocabulary and IDF, which is all keywords_for() needs."""
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, terms=np.array(self.terms, dtype=str), idf=self.idf, weighting=self.weighting)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path):
+        """Restores a saved vocabulary and IDF; returns False if missing or fitted with another weighting.
+        The document-term matrix is not saved, so weights() and top_keywords() need a new fit()."""
+        try:
+            with np.load(path) as saved:
+                if str(saved["weighting"]) != self.weighting:
+                    return False
+                self.terms, self.idf = saved["terms"].tolist(), saved["idf"]
+        except (OSError, ValueError, KeyError):
+            return False
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.counts = None
+        return True
+
+    def weights(self):
+        """Returns the weighted document-term matrix (same sparsity as the counts)."""
+        weighted = self.counts.copy()
+        term_freq = weighted.data
+        if self.weighting == "bm25":
+            doc_len = np.asarray(self.counts.sum(axis=1)).ravel()
+            avg_len = doc_len.mean() if len(doc_len) else 0.0
+            row_len = np.repeat(doc_len, np.diff(weighted.indptr))
+            norm = self.k1 * (1 - self.b + self.b * row_len / max(avg_len, 1e-9))
+            weighted.data = term_freq * (self.k1 + 1) / (term_freq + norm)
+        else:
+            weighted.data = 1 + np.log(term_freq)  # Sublinear term frequency
+        weighted.data *= self.idf[weighted.indices]
+        return weighted
+
+    def top_keywords(self, top_n=10):
+        """Returns the top_n highest-weighted terms of every fitted document."""
+        weighted = self.weights()
+        keywords = []
+        for row in range(weighted.shape[0]):
+            start, end = weighted.indptr[row], weighted.indptr[row + 1]
+            row_weights = weighted.data[start:end]
+            k = min(top_n, len(row_weights))
+            if k == 0:
+                keywords.append([])
+                continue
+            best = np.argpartition(-row_weights, k - 1)[:k]
+            best = best[np.argsort(-row_weights[best], kind="stable")]
+            keywords.append([self.terms[weighted.indices[start + i]] for i in best])
+        return keywords
+
+    def keywords_for(self, text, top_n=10):
+        """Keywords of a single text, weighted with the fitted corpus IDF (raw frequency if unfitted)."""
+        terms, term_counts = np.unique(tokenize(text), return_counts=True)
+        if not len(terms):
+            return []
+        scores = term_counts.astype(np.float32)
+        if self.idf is not None:
+            known = [self.vocabulary.get(term) for term in terms]
+            max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+            scores = (1 + np.log(scores)) * np.array([self.idf[i] if i is not None else max_idf for i in known])
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [str(terms[i]) for i in order]
@@ -0,0 +1,55 @@
+import json
+import os
+import networkx as nx
+import numpy as np
+
+# Folder holding the persisted knowledge graph and embedding matrix
+KG_STORE_FOLDER = "./cache/knowledge_graph"
+
+class KnowledgeGraphStore:
+    """
+    On-disk form of a KnowledgeGraph: the normalized embedding matrix as a .npy file
+    (memory-mapped when loaded), one metadata record per paper keyed by PDF content
+    hash, and the networkx graph as node-link JSON.
+    """
+
+    def __init__(self, folder=KG_STORE_FOLDER):
+        self.folder = folder
+        self.papers_path = os.path.join(folder, "papers.json")
+        self.embeddings_path = os.path.join(folder, "embeddings.npy")
+        self.graph_path = os.path.join(folder, "graph.json")
+
+    def load(self, model_name):
+        """Returns (papers, embeddings, graph) or None if nothing usable was saved for this model.
+        Row i of the memory-mapped embeddings belongs to papers[i]."""
+        if not all(os.path.exists(p) for p in [self.papers_path, self.embeddings_path, self.graph_path]):
+            return None
+        try:
+            with open(self.papers_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("model") != model_name:
+                return None  # Embeddings from another model are not comparable
+            embeddings = np.load(self.embeddings_path, mmap_mode="r")
+            with open(self.graph_path, "r", encoding="utf-8") as f:
+                graph = nx.node_link_graph(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable knowledge graph store: {e}")
+            return None
+        if len(embeddings) != len(saved["papers"]):
+            return None
+        return saved["papers"], embeddings, graph
+
+    def save(self, model_name, papers, embeddings, graph):
+        """Atomically replaces the stored graph, paper records and embedding matrix."""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.embeddings_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+        with open(self.graph_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(nx.node_link_data(graph), f)
+        with open(self.papers_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "papers": papers}, f)
+
+        # papers.json goes last: it is the file that makes a new version visible
+        os.replace(self.embeddings_path + ".tmp", self.embeddings_path)
+        os.replace(self.graph_path + ".tmp", self.graph_path)
+        os.replace(self.papers_path + ".tmp", self.papers_path)
@@ -0,0 +1,115 @@
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from keyword_engine import tokenize
+
+class InvertedIndex:
+    """
+    On-disk BM25 inverted index over the full text of the papers, stored in SQLite as
+    (term, document, term frequency) postings clustered by term. Documents are keyed
+    by name and PDF content hash, so syncing only re-indexes papers that were added or
+    changed, and a query reads just the postings of its own terms.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs = None  # doc_id -> (name, length), loaded on first search
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS docs (
+                   doc_id INTEGER PRIMARY KEY,
+                   name TEXT UNIQUE NOT NULL,
+                   hash TEXT NOT NULL,
+                   length INTEGER NOT NULL
+               )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS postings (
+                   term TEXT NOT NULL,
+                   doc_id INTEGER NOT NULL,
+                   tf INTEGER NOT NULL,
+                   PRIMARY KEY (term, doc_id)
+               ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+        self._conn.commit()
+
+    def __len__(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()
+        return count
+
+    def _remove(self, doc_id):
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+
+    def sync(self, papers, load_text):
+        """Makes the index match the given papers ({"name", "hash", ...} dicts).
+        load_text(paper) is only called for papers that are new or whose content changed.
+        Returns the number of re-indexed papers."""
+        with self._lock:
+            indexed = {name: (doc_id, content_hash) for doc_id, name, content_hash
+                       in self._conn.execute("SELECT doc_id, name, hash FROM docs")}
+            current = {paper["name"] for paper in papers}
+            for name, (doc_id, _) in indexed.items():
+                if name not in current:
+                    self._remove(doc_id)
+
+            updated = 0
+            for paper in papers:
+                doc_id, content_hash = indexed.get(paper["name"], (None, None))
+                if content_hash == paper["hash"]:
+                    continue
+                if doc_id is not None:
+                    self._remove(doc_id)
+                term_counts = Counter(tokenize(load_text(paper) or ""))
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (name, hash, length) VALUES (?, ?, ?)",
+                    (paper["name"], paper["hash"], sum(term_counts.values())),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in term_counts.items()],
+                )
+                updated += 1
+            self._conn.commit()
+            self._docs = None
+        return updated
+
+    def search(self, query):
+        """Returns {paper name: BM25 score} for every indexed paper containing a query term."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if self._docs is None:
+                self._docs = {doc_id: (name, length) for doc_id, name, length
+                              in self._conn.execute("SELECT doc_id, name, length FROM docs")}
+            postings = {
+                term: self._conn.execute("SELECT doc_id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+                for term in terms
+            }
+        n_docs = len(self._docs)
+        if not n_docs:
+            return {}
+        avg_len = max(sum(length for _, length in self._docs.values()) / n_docs, 1e-9)
+
+        scores = {}
+        for rows in postings.values():
+            idf = math.log1p((n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc_id, tf in rows:
+                name, length = self._docs[doc_id]
+                norm = self.k1 * (1 - self.b + self.b * length / avg_len)
+                scores[name] = scores.get(name, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
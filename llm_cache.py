@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Default location and size bound of the on-disk LLM response cache
+LLM_CACHE_PATH = "./cache/llm_cache.sqlite"
+MAX_CACHE_BYTES = 256 * (1 << 20)
+# Cache hits whose access times are held in memory before being written in one transaction
+ACCESS_FLUSH_EVERY = 256
+
+def cache_key(model_name, template_version, content):
+    """Content address of an LLM call: SHA-256 over model, prompt template version and input."""
+    digest = hashlib.sha256()
+    for part in (model_name, template_version, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM responses keyed by cache_key(). Identical prompts sent to
+    the same model with the same template version are answered from disk. Once the stored
+    responses exceed max_bytes, the least recently used ones are evicted. Hit and miss
+    counts are kept per process. Hits only record their access time in memory; the times
+    are written in batches, so reads cost no commit.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._accessed = {}  # key -> last access time not yet written
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # With WAL: no fsync per commit, still crash-safe
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                   key TEXT PRIMARY KEY,
+                   response TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Returns the cached response for a key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= ACCESS_FLUSH_EVERY:
+                self._flush_access_times()
+                self._conn.commit()
+        return row[0]
+
+    def _flush_access_times(self):
+        """Writes the buffered access times (the caller holds the lock and commits)."""
+        if self._accessed:
+            self._conn.executemany("UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                                   [(when, key) for key, when in self._accessed.items()])
+            self._accessed = {}
+
+    def set(self, key, response):
+        """Stores a response."""
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), time.time()),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops the least recently used responses until the cache fits in max_bytes."""
+        self._writes_since_evict = 0
+        self._flush_access_times()
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+
+    def stats(self):
+        """Returns hit/miss counts of this process and the current size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries, "bytes": size}
+
+    def close(self):
+        """Writes pending access times and closes the underlying database connection."""
+        with self._lock:
+            self._flush_access_times()
+            self._conn.commit()
+            self._conn.close()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Returns the process-wide LLM response cache, opening it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(os.getenv("LLM_CACHE_PATH", LLM_CACHE_PATH))
+    return _default_cache
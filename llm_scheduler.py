@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from rate_limiter import TokenBucket
+from llm_cache import cache_key, get_llm_cache
+
+# Request and token budgets per minute shared by all LLM calls (Gemini free tier: LLM_RPM=15, LLM_TPM=1000000)
+LLM_RPM = int(os.getenv("LLM_RPM", 1000))
+LLM_TPM = int(os.getenv("LLM_TPM", 4_000_000))
+# Calls in flight at once
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", 16))
+# Lower numbers are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), used to charge the tokens-per-minute budget."""
+    return max(1, len(text) // 4)
+
+def is_quota_error(error):
+    """True for rate-limit / overload errors worth retrying (HTTP 429/503, ResourceExhausted)."""
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    """
+    Local stand-in for a Gemini model: answers after `latency` seconds with a short,
+    deterministic text derived from the prompt, and raises a quota error for every
+    `fail_every`-th call so retry paths can be exercised without the API. With
+    stream=True the answer arrives word by word, spread over the same latency.
+    """
+
+    model_name = "fake"
+
+    def __init__(self, latency=0.05, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if self.fail_every and call % self.fail_every == 0:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        words = prompt.split()
+        text = f"[fake summary of {len(words)} words] " + " ".join(words[-40:])
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency)
+        return FakeResponse(text)
+
+    def _stream(self, text):
+        pieces = [piece + " " for piece in text.split(" ")]
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            yield FakeResponse(piece)
+
+class LLMScheduler:
+    """
+    Runs LLM calls on a pool of worker threads. Calls wait in a priority queue and are
+    released only within the requests-per-minute and tokens-per-minute budgets (token
+    buckets). Quota errors are retried with full-jitter exponential backoff; any other
+    error is returned to the caller. The model is any object with generate_content(prompt)
+    returning a response with .text; by default the shared Gemini model is loaded on first use.
+    Calls that name their prompt template version are answered from the response cache
+    when the same prompt was already sent to the same model.
+    """
+
+    def __init__(self, model=None, rpm=LLM_RPM, tpm=LLM_TPM, workers=LLM_WORKERS,
+                 max_retries=5, backoff_base=2.0, backoff_cap=60.0, cache=None, model_name=None):
+        self._model = model
+        model_name = model_name or getattr(model, "model_name", None)
+        if model_name is None:
+            from gemini_client import GEMINI_MODEL
+
+            model_name = GEMINI_MODEL
+        self.model_name = model_name
+        self.cache = cache
+        self.tpm = tpm
+        self.requests_bucket = TokenBucket(rpm / 60.0, rpm)
+        self.tokens_bucket = TokenBucket(tpm / 60.0, tpm)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "tokens": 0}
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    @property
+    def model(self):
+        if self._model is None:
+            from gemini_client import get_gemini_model
+
+            self._model = get_gemini_model()
+        return self._model
+
+    def _start_workers(self):
+        """Starts the worker threads on first submit."""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True, name=f"llm-worker-{len(self._threads)}")
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, prompt, priority=PRIORITY_NORMAL, template=None):
+        """Queues a prompt and returns a Future resolving to the response text.
+        With a template version and a cache, a cached response resolves the Future at once."""
+        future = Future()
+        key = cache_key(self.model_name, template, prompt) if template and self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("LLM scheduler is shut down")
+            self._start_workers()
+            heapq.heappush(self._queue, (priority, next(self._sequence), prompt, key, future))
+            self._condition.notify()
+        return future
+
+    def generate(self, prompt, priority=PRIORITY_NORMAL, template=None):
+        """Sends a prompt through the scheduler and waits for the response text."""
+        return self.submit(prompt, priority, template).result()
+
+    def map(self, prompts, priority=PRIORITY_NORMAL, template=None):
+        """Runs prompts concurrently and returns their response texts in order."""
+        return [future.result() for future in [self.submit(prompt, priority, template) for prompt in prompts]]
+
+    def stream(self, prompt, template=None):
+        """Yields the response text piece by piece as the model produces it.
+        Runs on the calling thread within the same budgets; a quota error is retried only
+        before the first piece arrives. A cached response is yielded whole, and a completed
+        stream is cached like any other call."""
+        key = cache_key(self.model_name, template, prompt) if template and self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        tokens = min(estimate_tokens(prompt), self.tpm)
+        pieces = []
+        for attempt in range(self.max_retries + 1):
+            self.requests_bucket.acquire()
+            self.tokens_bucket.acquire(tokens)
+            self._count(requests=1, tokens=tokens)
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        pieces.append(chunk.text)
+                        yield chunk.text
+                break
+            except Exception as e:
+                if pieces or not is_quota_error(e) or attempt == self.max_retries:
+                    self._count(failures=1)
+                    raise
+                self._count(retries=1)
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+        if key and pieces:
+            self.cache.set(key, "".join(pieces))
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, prompt, key, future = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                response_text = self._call(prompt)
+                if key and response_text:
+                    self.cache.set(key, response_text)
+                future.set_result(response_text)
+            except Exception as e:
+                self._count(failures=1)
+                future.set_exception(e)
+
+    def _count(self, **deltas):
+        with self._condition:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def _call(self, prompt):
+        """Calls the model within the budgets, retrying quota errors with backoff."""
+        tokens = min(estimate_tokens(prompt), self.tpm)
+        for attempt in range(self.max_retries + 1):
+            self.requests_bucket.acquire()
+            self.tokens_bucket.acquire(tokens)
+            self._count(requests=1, tokens=tokens)
+            try:
+                return self.model.generate_content(prompt).text
+            except Exception as e:
+                if not is_quota_error(e) or attempt == self.max_retries:
+                    raise
+                self._count(retries=1)
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+
+    def shutdown(self, wait=True):
+        """Stops the workers once the queued calls are done."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    """Returns the process-wide LLM scheduler; LLM_FAKE_MODEL=1 makes it use FakeModel instead of Gemini."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            model = FakeModel() if os.getenv("LLM_FAKE_MODEL") == "1" else None
+            _scheduler = LLMScheduler(model=model, cache=get_llm_cache())
+    return _scheduler
+
+def set_llm_scheduler(scheduler):
+    """Replaces the process-wide LLM scheduler (e.g. with one around a FakeModel)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
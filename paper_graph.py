@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import numpy as np
+from scipy import sparse
+from crawl_frontier import normalize_doi
+
+# Queries per block when computing kNN edges, keeps the score matrix small for large corpora
+KNN_BLOCK_SIZE = 256
+
+def doi_file_stem(doi):
+    """Filename stem under which the downloader saves a DOI (see PaperDownloader.download_paper)."""
+    return normalize_doi(doi).replace("/", "_")
+
+class PaperGraph:
+    """
+    Paper-to-paper edges stored as sparse CSR matrices over a fixed paper order:
+    directed citation edges learned from the reference extractor output and
+    symmetric kNN similarity edges from the embedding matrix. Ranking runs on the
+    sparse matrices directly, so memory stays proportional to the number of edges.
+    """
+
+    def __init__(self, names, citations=None, similarity=None, fingerprint=None):
+        self.names = list(names)
+        self.fingerprint = fingerprint  # references_fingerprint() of the folder the citations came from
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        self.citations = citations if citations is not None else sparse.csr_matrix((n, n), dtype=np.float32)
+        self.similarity = similarity if similarity is not None else sparse.csr_matrix((n, n), dtype=np.float32)
+        self._adjacency = None
+
+    @staticmethod
+    def references_fingerprint(references_folder):
+        """Hash of the names, sizes and modification times of the *_references.json files,
+        so saved citation edges are rebuilt when references are added or re-extracted."""
+        digest = hashlib.sha1()
+        if os.path.isdir(references_folder):
+            for file_name in sorted(os.listdir(references_folder)):
+                if file_name.endswith("_references.json"):
+                    stat = os.stat(os.path.join(references_folder, file_name))
+                    digest.update(f"{file_name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def citation_matrix(names, references_folder, paper_dois=None):
+        """Builds the directed citation matrix (row cites column) from *_references.json files.
+        Cited DOIs are matched to papers by download filename and by the DOI found on their first page."""
+        positions = {name: i for i, name in enumerate(names)}
+        by_doi = {}
+        for name in names:
+            stem = os.path.splitext(name)[0]
+            by_doi[stem.removesuffix("_scihub").lower()] = positions[name]
+        for name, doi in (paper_dois or {}).items():
+            if doi and normalize_doi(doi).startswith("10.") and name in positions:
+                by_doi[doi_file_stem(doi)] = positions[name]
+
+        rows, cols = [], []
+        if os.path.isdir(references_folder):
+            for file_name in os.listdir(references_folder):
+                citing = positions.get(file_name.removesuffix("_references.json") + ".pdf")
+                if citing is None or not file_name.endswith("_references.json"):
+                    continue
+                try:
+                    with open(os.path.join(references_folder, file_name), "r", encoding="utf-8") as f:
+                        references = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                for entry in references:
+                    doi = normalize_doi(entry.get("DOI") or "")
+                    cited = by_doi.get(doi.replace("/", "_")) if doi.startswith("10.") else None
+                    if cited is not None and cited != citing:
+                        rows.append(citing)
+                        cols.append(cited)
+
+        n = len(names)
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n))
+        matrix.data[:] = 1.0  # Collapse duplicate citations
+        return matrix
+
+    @staticmethod
+    def knn_matrix(index, k=10, min_similarity=0.3):
+        """Builds symmetric kNN similarity edges by searching the vector index with its own rows."""
+        n = len(index.keys)
+        positions = {key: i for i, key in enumerate(index.keys)}
+        rows, cols, weights = [], [], []
+        for start in range(0, n, KNN_BLOCK_SIZE):
+            hits = index.search(index.matrix[start:start + KNN_BLOCK_SIZE], k + 1)
+            for offset, neighbours in enumerate(hits):
+                row = start + offset
+                for key, score in neighbours:
+                    col = positions[key]
+                    if col != row and score >= min_similarity:
+                        rows.append(row)
+                        cols.append(col)
+                        weights.append(score)
+
+        matrix = sparse.csr_matrix((np.array(weights, dtype=np.float32), (rows, cols)), shape=(n, n))
+        return matrix.maximum(matrix.T).tocsr()
+
+    @classmethod
+    def build(cls, index, references_folder, paper_dois=None, k=10, min_similarity=0.3):
+        """Builds citation and similarity edges for the papers of a vector index."""
+        return cls(
+            index.keys,
+            citations=cls.citation_matrix(index.keys, references_folder, paper_dois),
+            similarity=cls.knn_matrix(index, k, min_similarity),
+            fingerprint=cls.references_fingerprint(references_folder),
+        )
+
+    def adjacency(self, citation_weight=1.0, similarity_weight=1.0):
+        """Undirected weighted adjacency combining both edge types; the equal-weight one is built once."""
+        if (citation_weight, similarity_weight) != (1.0, 1.0):
+            return (citation_weight * (self.citations + self.citations.T) + similarity_weight * self.similarity).tocsr()
+        if self._adjacency is None:
+            self._adjacency = (self.citations + self.citations.T + self.similarity).tocsr()
+        return self._adjacency
+
+    def pagerank(self, damping=0.85, personalization=None, directed_citations=True, tol=1e-6, max_iter=100):
+        """Power-iteration PageRank on the sparse graph; returns a score per paper.
+        By default only citation edges are followed (cited papers gain rank); pass
+        directed_citations=False to rank over the combined undirected graph instead."""
+        n = len(self.names)
+        if n == 0:
+            return np.empty(0, dtype=np.float32)
+        matrix = self.citations if directed_citations else self.adjacency()
+        out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+        inv_out = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight > 0)
+        transition = sparse.diags(inv_out) @ matrix  # Row-stochastic except for dangling rows
+
+        teleport = np.full(n, 1.0 / n) if personalization is None else np.asarray(personalization, dtype=np.float64)
+        teleport = teleport / teleport.sum()
+        dangling = out_weight == 0
+        rank = teleport.copy()
+        for _ in range(max_iter):
+            new_rank = damping * (transition.T @ rank + rank[dangling].sum() * teleport) + (1 - damping) * teleport
+            if np.abs(new_rank - rank).sum() < tol:
+                rank = new_rank
+                break
+            rank = new_rank
+        return rank
+
+    def neighbors(self, name):
+        """Returns {paper: weight} for the papers linked to a paper by either edge type."""
+        row = self.adjacency().getrow(self.positions[name])
+        return {self.names[col]: float(weight) for col, weight in zip(row.indices, row.data)}
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        sparse.save_npz(os.path.join(folder, "citations.npz"), self.citations)
+        sparse.save_npz(os.path.join(folder, "similarity.npz"), self.similarity)
+        meta_path = os.path.join(folder, "paper_graph.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"names": self.names, "fingerprint": self.fingerprint}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, folder, names, fingerprint):
+        """Loads saved edges for the given paper order, or returns None if missing or stale
+        (other papers, or references changed since the edges were built)."""
+        try:
+            with open(os.path.join(folder, "paper_graph.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            citations = sparse.load_npz(os.path.join(folder, "citations.npz")).tocsr()
+            similarity = sparse.load_npz(os.path.join(folder, "similarity.npz")).tocsr()
+        except (OSError, ValueError):
+            return None
+        if meta.get("names") != list(names) or meta.get("fingerprint") != fingerprint:
+            return None
+        if citations.shape != (len(names), len(names)) or similarity.shape != citations.shape:
+            return None
+        return cls(names, citations, similarity, fingerprint)
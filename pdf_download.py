@@ -0,0 +1,105 @@
+import os
+import time
+from http_client import get_http_client
+
+# Bytes read from the socket and written to disk per iteration
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Downloads larger than this are aborted (papers are rarely above a few dozen MB)
+MAX_PDF_BYTES = 100 * (1 << 20)
+# Every PDF starts with this header, which the spec allows within the first 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_MAGIC_WINDOW = 1024
+
+class DownloadError(ValueError):
+    """Raised when a response is not an acceptable PDF (wrong type, too large, bad status)."""
+
+def looks_like_pdf(data):
+    """True if the first bytes of a payload carry the PDF header."""
+    return PDF_MAGIC in data[:PDF_MAGIC_WINDOW]
+
+def is_pdf_file(file_path):
+    """True if the file exists and starts like a PDF."""
+    try:
+        with open(file_path, "rb") as f:
+            return looks_like_pdf(f.read(PDF_MAGIC_WINDOW))
+    except OSError:
+        return False
+
+def format_bytes(count):
+    """Human-readable byte count for progress messages."""
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+def download_pdf_file(url, file_path, headers=None, timeout=10, max_bytes=MAX_PDF_BYTES,
+                      chunk_size=DOWNLOAD_CHUNK_SIZE, progress=None, require_pdf_type=False):
+    """
+    Streams a PDF to file_path and returns {"bytes", "seconds", "bytes_per_sec", "resumed"}.
+
+    Data goes to "<file_path>.part" and is renamed into place only once complete and
+    validated, so file_path never holds a partial download. If a .part file survives an
+    earlier failure the transfer resumes with an HTTP Range request. Payloads without the
+    PDF header or above max_bytes raise DownloadError and are discarded. progress(done, total)
+    is called after every chunk (total is None when the server sends no length).
+    With require_pdf_type, the GET response must be served as application/pdf (or the URL
+    end in .pdf); this answers from the GET headers what a separate HEAD request would.
+    Network errors propagate as requests exceptions and keep the .part file for a later resume.
+    """
+    part_path = f"{file_path}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset:
+        headers = dict(headers or {}, Range=f"bytes={offset}-")
+    started = time.perf_counter()
+    response = get_http_client().get(url, stream=True, timeout=timeout, headers=headers)
+
+    try:
+        if response.status_code == 416 and offset:
+            # The .part file does not fit the current resource: start over
+            response.close()
+            os.remove(part_path)
+            return download_pdf_file(url, file_path, headers={k: v for k, v in headers.items() if k != "Range"},
+                                     timeout=timeout, max_bytes=max_bytes, chunk_size=chunk_size, progress=progress,
+                                     require_pdf_type=require_pdf_type)
+        if response.status_code not in (200, 206):
+            raise DownloadError(f"HTTP {response.status_code}")
+        if response.status_code == 200:
+            offset = 0  # Server ignored the Range header and sent the whole file
+        if require_pdf_type and "application/pdf" not in response.headers.get("Content-Type", "") \
+                and not url.lower().endswith(".pdf"):
+            raise DownloadError("Not a direct PDF link")
+
+        content_length = response.headers.get("Content-Length")
+        total = offset + int(content_length) if content_length and content_length.isdigit() else None
+        if total is not None and total > max_bytes:
+            raise DownloadError(f"File too large ({format_bytes(total)} > {format_bytes(max_bytes)})")
+
+        done = offset
+        with open(part_path, "ab" if offset else "wb") as part_file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                if done == 0 and not looks_like_pdf(chunk):
+                    raise DownloadError("Response is not a PDF")
+                done += len(chunk)
+                if done > max_bytes:
+                    raise DownloadError(f"File exceeds {format_bytes(max_bytes)}")
+                part_file.write(chunk)
+                if progress:
+                    progress(done, total)
+    except DownloadError:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    finally:
+        response.close()
+
+    if not is_pdf_file(part_path):
+        os.remove(part_path)
+        raise DownloadError("Response is not a PDF")
+    os.replace(part_path, file_path)
+
+    elapsed = time.perf_counter() - started
+    received = done - offset
+    return {"bytes": done, "seconds": elapsed, "bytes_per_sec": received / max(elapsed, 1e-9), "resumed": offset > 0}
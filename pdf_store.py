@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import fitz  # PyMuPDF
+
+# Folder holding one compressed JSON record per parsed PDF, named by content hash
+PDF_STORE_FOLDER = "./cache/parsed_pdfs"
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+def file_hash(pdf_path):
+    """Returns the SHA-256 of a file's content, memoized by path, size and modification time."""
+    stat = os.stat(pdf_path)
+    memo_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    with _hash_lock:
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+def extract_first_page_metadata(first_page_text):
+    """Extracts title, authors, and DOI from the text of a PDF's first page."""
+    # Extract Title (First Large Text Line)
+    title = first_page_text.split("\n")[0].strip()
+
+    # Extract Authors (Lines after title but before Abstract)
+    author_lines = []
+    for line in first_page_text.split("\n")[1:]:
+        if "abstract" in line.lower():
+            break
+        author_lines.append(line.strip())
+
+    authors = ", ".join(author_lines)
+
+    # Extract DOI
+    doi_match = re.search(r"10\.\d{4,9}/[-._;()/:A-Z0-9]+", first_page_text, re.I)
+    doi = doi_match.group(0) if doi_match else "DOI not found"
+
+    return {"title": title, "authors": authors, "doi": doi}
+
+def extract_publication_year(first_page_text):
+    """Best-effort publication year: the first plausible year printed on the first page, or None."""
+    year_match = re.search(r"\b(19[5-9]\d|20[0-4]\d)\b", first_page_text)
+    return int(year_match.group(1)) if year_match else None
+
+def extract_tables(pdf_path):
+    """Extracts tables from a PDF using pdfplumber."""
+    import pdfplumber  # Only needed by agents that ask for tables
+
+    tables = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num, page in enumerate(pdf.pages):
+            table = page.extract_table()
+            if table:
+                tables.append({"page": page_num + 1, "table_data": table})
+    return tables
+
+def parse_pdf(pdf_path, include_tables=False):
+    """Parses a PDF in one pass: text per page, first-page metadata, image xrefs and optionally tables."""
+    with fitz.open(pdf_path) as doc:
+        pages = [page.get_text("text") for page in doc]
+        images = [
+            {"page": page_num + 1, "index": img_index + 1, "xref": img[0]}
+            for page_num, page in enumerate(doc)
+            for img_index, img in enumerate(page.get_images(full=True))
+        ]
+
+    return {
+        "pages": pages,
+        "metadata": extract_first_page_metadata(pages[0] if pages else ""),
+        "images": images,
+        "tables": extract_tables(pdf_path) if include_tables else None,
+    }
+
+class ParsedPDFStore:
+    """
+    Content-addressed store of parsed PDFs shared by all agents. Each PDF is parsed
+    once; the result is kept as gzip-compressed JSON on disk and in a small in-memory
+    LRU, so later agents read the parsed document instead of reopening the PDF.
+    Tables are only extracted the first time an agent asks for them.
+    """
+
+    def __init__(self, folder=PDF_STORE_FOLDER, memory_items=64):
+        self.folder = folder
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _record_path(self, key):
+        return os.path.join(self.folder, f"{key}.json.gz")
+
+    def _load(self, key):
+        """Reads a record from memory or disk, or returns None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        record_path = self._record_path(key)
+        if not os.path.exists(record_path):
+            return None
+        try:
+            with gzip.open(record_path, "rt", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None  # Corrupt or partially written record: parse again
+        self._remember(key, record)
+        return record
+
+    def _remember(self, key, record):
+        with self._lock:
+            self._memory[key] = record
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _save(self, key, record):
+        """Writes a record atomically so concurrent readers never see a partial file."""
+        record_path = self._record_path(key)
+        tmp_path = f"{record_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, record_path)
+        self._remember(key, record)
+
+    def get(self, pdf_path, include_tables=False):
+        """Returns the parsed document for a PDF, parsing it only if this content was never seen."""
+        key = file_hash(pdf_path)
+        record = self._load(key)
+        if record is None:
+            record = parse_pdf(pdf_path, include_tables=include_tables)
+            self._save(key, record)
+        elif include_tables and record.get("tables") is None:
+            record = dict(record, tables=extract_tables(pdf_path))
+            self._save(key, record)
+        return record
+
+    def get_text(self, pdf_path, separator="\n"):
+        """Returns the full text of a PDF with pages joined by separator."""
+        return separator.join(self.get(pdf_path)["pages"])
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_pdf_store():
+    """Returns the process-wide parsed PDF store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ParsedPDFStore(os.getenv("PDF_STORE_FOLDER", PDF_STORE_FOLDER))
+    return _store
+
+def parse_into_store(pdf_paths, include_tables=False, folder=PDF_STORE_FOLDER):
+    """Worker entry point: parses a chunk of PDFs into the on-disk store. Returns (pdf_path, error) pairs."""
+    store = ParsedPDFStore(folder)
+    results = []
+    for pdf_path in pdf_paths:
+        try:
+            store.get(pdf_path, include_tables=include_tables)
+            results.append((pdf_path, None))
+        except Exception as e:
+            results.append((pdf_path, str(e)))
+    return results
+
+def parse_pool(max_workers=None):
+    """Process pool for PDF parsing. Workers are spawned, not forked: callers run download,
+    LLM and event-loop threads, and a fork could copy their locks while held."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def parse_pdfs_parallel(pdf_paths, include_tables=False, max_workers=None, chunk_size=None):
+    """Parses PDFs across CPU cores in chunks, yielding (pdf_path, error) as each chunk completes.
+    Parsed documents land in the shared store, so callers read them with get_pdf_store().get()."""
+    pdf_paths = list(pdf_paths)
+    if not pdf_paths:
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    # Several chunks per worker keeps cores busy when PDF sizes vary, while amortizing process overhead
+    chunk_size = chunk_size or max(1, math.ceil(len(pdf_paths) / (max_workers * 4)))
+    folder = get_pdf_store().folder
+
+    if max_workers == 1 or len(pdf_paths) == 1:
+        for pdf_path in pdf_paths:
+            yield from parse_into_store([pdf_path], include_tables, folder)
+        return
+
+    with parse_pool(max_workers) as executor:
+        futures = [
+            executor.submit(parse_into_store, pdf_paths[i:i + chunk_size], include_tables, folder)
+            for i in range(0, len(pdf_paths), chunk_size)
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Requests per second and burst size allowed per API host.
+# CrossRef's polite pool (requests carrying a mailto) allows ~10 req/s.
+HOST_RATE_LIMITS = {
+    "api.crossref.org": (float(os.getenv("CROSSREF_RATE_LIMIT", 10)), 10),
+    "api.openalex.org": (10, 10),
+    "api.semanticscholar.org": (1, 1),
+    "export.arxiv.org": (1, 1),
+}
+DEFAULT_RATE_LIMIT = (5, 5)
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` tokens are available and consumes them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_rate_limiter(host):
+    """Returns the shared token bucket for an API host."""
+    with _buckets_lock:
+        if host not in _buckets:
+            rate, capacity = HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+            _buckets[host] = TokenBucket(rate, capacity)
+        return _buckets[host]
+
+def throttle(url):
+    """Waits for the rate limiter of the URL's host before a request is sent."""
+    get_rate_limiter(urlparse(url).netloc.lower()).acquire()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+
+# Journal of finished pipeline work, shared by all stages
+RUN_MANIFEST_PATH = "./cache/run_manifest.jsonl"
+# Per-run folders of seed papers, crawled papers and references
+WORKSPACES_FOLDER = "./workspaces"
+
+class RunManifest:
+    """
+    Records, per pipeline stage, which artifacts have been produced and from which input
+    content hash. Each checkpoint is appended to a JSON-lines journal as soon as it is
+    reached, so an interrupted run resumes where it stopped and a rerun only redoes
+    work whose input changed or whose output has gone missing.
+    """
+
+    def __init__(self, path=RUN_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn last line from an interrupted write
+                    self.entries[(entry["stage"], entry["artifact"])] = entry
+            self._compact()
+
+    def _compact(self):
+        """Rewrites the journal with only the latest entry per artifact."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def get(self, stage, artifact):
+        """Returns the checkpoint recorded for an artifact, or None."""
+        return self.entries.get((stage, os.path.normpath(artifact)))
+
+    def is_done(self, stage, artifact, content_hash):
+        """True if the artifact exists and was produced from input with this content hash."""
+        entry = self.get(stage, artifact)
+        return bool(entry) and entry["hash"] == content_hash and os.path.exists(artifact)
+
+    def mark_done(self, stage, artifact, content_hash, **info):
+        """Checkpoints a finished artifact together with the hash of the input it was built from."""
+        entry = {"stage": stage, "artifact": os.path.normpath(artifact), "hash": content_hash, **info}
+        with self._lock:
+            self.entries[(stage, entry["artifact"])] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_run_manifest():
+    """Returns the process-wide run manifest."""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = RunManifest(os.getenv("RUN_MANIFEST_PATH", RUN_MANIFEST_PATH))
+    return _manifest
+
+def run_workspace(seeds, root=WORKSPACES_FOLDER):
+    """Returns the working folder of a run, named after the seeds it starts from (e.g. the
+    selected papers' URLs). Each selection gets its own papers, references and downloads,
+    while the same selection reuses its folder and resumes from the manifest."""
+    digest = hashlib.sha1("\n".join(sorted(seeds)).encode("utf-8")).hexdigest()[:12]
+    workspace = os.path.join(root, digest)
+    os.makedirs(workspace, exist_ok=True)
+    return workspace
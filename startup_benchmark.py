@@ -0,0 +1,64 @@
+import statistics
+import subprocess
+import sys
+
+# Modules whose cold import time matters for app start and Streamlit reruns
+MODULES = [
+    "http_client",
+    "pdf_store",
+    "Referece_extractor_agent",
+    "Paper_downloader_Agent",
+    "crawl_engine",
+    "Knowledge_Graph",
+    "Summariser_agent",
+    "Writer_agent",
+]
+
+# Snippets timed after their imports, e.g. constructing a KnowledgeGraph without using it
+SNIPPETS = {
+    "KnowledgeGraph()": ("from Knowledge_Graph import KnowledgeGraph",
+                         "KnowledgeGraph('./Collected_Papers', './related_papers')"),
+    "first embedding": ("from Knowledge_Graph import get_sentence_model",
+                        "get_sentence_model().encode('warm up')"),
+}
+
+def time_in_fresh_interpreter(setup, statement):
+    """Runs setup then statement in a new interpreter and returns the statement's wall time in seconds."""
+    code = (
+        "import time\n"
+        f"{setup}\n"
+        "started = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def print_offline_resources():
+    """Prints which models and NLTK data are already on disk; missing ones are downloaded on first use,
+    which makes the timings below much slower than a warm start."""
+    from Knowledge_Graph import check_offline_resources
+
+    print(f"{'resource':<40} {'available':>10}")
+    for resource, available in check_offline_resources().items():
+        print(f"{resource:<40} {'yes' if available else 'MISSING':>10}")
+    print()
+
+def run_benchmark(repeat=3):
+    """Prints the median cold-start cost of each module import and snippet."""
+    print_offline_resources()
+    cases = [(f"import {module}", "", f"import {module}") for module in MODULES]
+    cases += [(name, setup, statement) for name, (setup, statement) in SNIPPETS.items()]
+
+    print(f"{'case':<40} {'median (s)':>10}")
+    for name, setup, statement in cases:
+        try:
+            timings = [time_in_fresh_interpreter(setup, statement) for _ in range(repeat)]
+            print(f"{name:<40} {statistics.median(timings):>10.3f}")
+        except RuntimeError as e:
+            print(f"{name:<40} {'error':>10}  {e}")
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -1,17 +1,13 @@
 import streamlit as st
-from crewai import Agent, Task, Crew
 import requests
 import json
 import os
-import shutil
 import re
+import shutil
 from dotenv import load_dotenv
-from copy_files import copy_files
-from Referece_extractor_agent import process_pdfs_in_folder
-from Paper_downloader_Agent import download_papers_from_dois
-from Summariser_agent import process_all_pdfs_in_folder
-from Knowledge_Graph import KnowledgeGraph
-import Writer_agent
+from http_client import get_http_client
+from pdf_download import download_pdf_file, format_bytes
+from run_manifest import run_workspace
 
 # Load API key from .env file
 load_dotenv()
@@ -20,22 +16,8 @@ if not SERPERDEV_API_KEY:
     st.error("Please set the SERPERDEV_API_KEY in the .env file.")
     st.stop()
 
-pdf_folder = "selected_papers"
-if os.path.exists(pdf_folder):
-    shutil.rmtree(pdf_folder)
-os.makedirs(pdf_folder, exist_ok=True)
-
-# Folder to save Total collected Papers
-target_folder = "./Collected_Papers"
-if os.path.exists(target_folder):
-    shutil.rmtree(target_folder)  # Refresh folder on every run
-os.makedirs(target_folder, exist_ok=True)
-
-# Define folders
-RELATED_PAPERS_FOLDER = "./related_papers"
-if os.path.exists(target_folder):
-    shutil.rmtree(target_folder)  # Refresh folder on every run
-os.makedirs(target_folder, exist_ok=True)
+# Seed papers downloaded in parallel
+SEED_DOWNLOAD_WORKERS = 6
 
 # Function to sanitize filenames
 def sanitize_filename(filename):
@@ -49,7 +31,7 @@ def search_papers(query):
     url = "https://google.serper.dev/scholar"
     payload = json.dumps({"q": query})
     headers = {'X-API-KEY': SERPERDEV_API_KEY, 'Content-Type': 'application/json'}
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = get_http_client().post(url, headers=headers, data=payload)
     return response.json().get("organic", [])[:10]  # Limit to top 10 results
 
 def select_papers(search_results):
@@ -69,51 +51,79 @@ def select_papers(search_results):
     
     return selected_papers
 
-def download_pdf(selected_papers):
+def seed_filenames(papers, pdf_folder):
+    """Returns a distinct PDF path per paper; titles that sanitize to the same name get _2, _3, ..."""
+    filenames, taken = [], set()
+    for paper in papers:
+        title_cleaned = sanitize_filename(paper["title"]).replace(" ", "_").replace("/", "-")
+        stem, suffix = title_cleaned, 1
+        while stem.lower() in taken:
+            suffix += 1
+            stem = f"{title_cleaned}_{suffix}"
+        taken.add(stem.lower())
+        filenames.append(os.path.join(pdf_folder, f"{stem}.pdf"))
+    return filenames
+
+def download_seed_paper(paper, filename):
+    """Downloads one selected paper; runs on a worker thread, so it must not call Streamlit."""
+    try:
+        # The GET response's Content-Type decides if this is a direct PDF link (no HEAD round-trip)
+        stats = download_pdf_file(paper["pdfUrl"], filename, headers={'User-Agent': 'Mozilla/5.0'},
+                                  require_pdf_type=True)
+        return filename, stats, None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return filename, None, e
+
+def download_pdf(selected_papers, pdf_folder):
+    """Downloads the selected papers concurrently and reports each one as soon as it finishes."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    papers = [paper for paper in selected_papers if paper.get("pdfUrl")]
+    if not papers:
+        return []
     failed_downloads = []
-    for paper in selected_papers:
-        pdf_url = paper.get("pdfUrl")
-        if pdf_url:
-            title_cleaned = sanitize_filename(paper["title"]).replace(" ", "_").replace("/", "-")
-            filename = os.path.join(pdf_folder, f"{title_cleaned}.pdf")
-            try:
-                response = requests.head(pdf_url, allow_redirects=True, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-                content_type = response.headers.get('Content-Type', '')
-                if 'application/pdf' in content_type or pdf_url.endswith('.pdf'):
-                    response = requests.get(pdf_url, stream=True, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-                    response.raise_for_status()
-                    with open(filename, "wb") as file:
-                        for chunk in response.iter_content(1024):
-                            file.write(chunk)
-                    st.success(f"✅ Downloaded: {filename}")
-                else:
-                    raise ValueError("Not a direct PDF link")
-            except (requests.exceptions.RequestException, ValueError) as e:
-                st.error(f"❌ Failed to download {filename}: {e}")
-                failed_downloads.append(pdf_url)
+    progress_bar = st.progress(0.0, text=f"Downloading {len(papers)} papers...")
+    with ThreadPoolExecutor(max_workers=min(SEED_DOWNLOAD_WORKERS, len(papers))) as executor:
+        futures = {executor.submit(download_seed_paper, paper, filename): paper
+                   for paper, filename in zip(papers, seed_filenames(papers, pdf_folder))}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            filename, stats, error = future.result()
+            if error is None:
+                st.success(f"✅ Downloaded: {filename} ({format_bytes(stats['bytes'])}, "
+                           f"{format_bytes(stats['bytes_per_sec'])}/s)")
+            else:
+                st.error(f"❌ Failed to download {filename}: {error}")
+                failed_downloads.append(futures[future]["pdfUrl"])
+            progress_bar.progress(finished / len(papers), text=f"Downloaded {finished}/{len(papers)} papers")
     return failed_downloads
 
-# Define Agents without LLM dependencies
-search_agent = Agent(
-    name="Search Agent",
-    role="Researcher",
-    goal="Finds relevant academic papers from Google Scholar.",
-    backstory="An expert in academic research, dedicated to discovering valuable sources."
-)
-
-selection_agent = Agent(
-    name="Selection Agent",
-    role="Evaluator",
-    goal="Helps users manually select the most relevant papers.",
-    backstory="A meticulous reviewer who ensures only the best papers are chosen."
-)
-
-download_agent = Agent(
-    name="Download Agent",
-    role="Downloader",
-    goal="Ensures selected papers are downloaded and organized properly.",
-    backstory="A diligent archivist focused on preserving academic papers."
-)
+# Define Agents without LLM dependencies (crewai is imported and the agents built only when a crawl starts)
+@st.cache_resource
+def get_crew_agents():
+    from crewai import Agent
+
+    search_agent = Agent(
+        name="Search Agent",
+        role="Researcher",
+        goal="Finds relevant academic papers from Google Scholar.",
+        backstory="An expert in academic research, dedicated to discovering valuable sources."
+    )
+
+    selection_agent = Agent(
+        name="Selection Agent",
+        role="Evaluator",
+        goal="Helps users manually select the most relevant papers.",
+        backstory="A meticulous reviewer who ensures only the best papers are chosen."
+    )
+
+    download_agent = Agent(
+        name="Download Agent",
+        role="Downloader",
+        goal="Ensures selected papers are downloaded and organized properly.",
+        backstory="A diligent archivist focused on preserving academic papers."
+    )
+
+    return search_agent, selection_agent, download_agent
 
 # Streamlit UI
 st.title("Deep Research Agentic Bot")
@@ -129,7 +139,26 @@ if st.button("Search"):
 if "search_results" in st.session_state:
     selected_papers = select_papers(st.session_state["search_results"])
     if st.button("Download Selected Papers"):
-        failed_downloads = download_pdf(selected_papers)
+        # Heavy agent modules are only imported once the user actually starts the pipeline
+        get_crew_agents()
+        from copy_files import copy_files
+        from Referece_extractor_agent import process_pdfs_in_folder
+        from Paper_downloader_Agent import download_papers_from_dois
+        from Knowledge_Graph import KnowledgeGraph
+        from Summariser_agent import process_all_pdfs_in_folder
+        import Writer_agent
+
+        # Each selection runs in its own workspace, so papers of earlier queries never leak into this one;
+        # finished work is tracked in the run manifest, so rerunning the same selection only processes new papers
+        workspace = run_workspace(paper["pdfUrl"] for paper in selected_papers if paper.get("pdfUrl"))
+        pdf_folder = os.path.join(workspace, "selected_papers")
+        target_folder = os.path.join(workspace, "Collected_Papers")
+        references_folder = os.path.join(workspace, "references_json")
+        download_folder = os.path.join(workspace, "downloaded_papers")
+        for folder in [pdf_folder, target_folder]:
+            os.makedirs(folder, exist_ok=True)
+
+        failed_downloads = download_pdf(selected_papers, pdf_folder)
         if failed_downloads:
             st.warning("❌ Some PDFs could not be downloaded:")
             for url in failed_downloads:
@@ -137,25 +166,29 @@ if "search_results" in st.session_state:
         st.success("📂 All available PDFs have been downloaded.")
         
         # Copy Selected intial papers to Collected_Papers
-        copy_files("./selected_papers", "./Collected_Papers")
+        copy_files(pdf_folder, target_folder)
         st.success("📂 Intially Selected Papers successfully moved to Collected_Papers(root) folder.")
         
         # Level 1: Calling Reference Extractor
-        process_pdfs_in_folder("./selected_papers", "./references_json")
+        process_pdfs_in_folder(pdf_folder, references_folder)
         st.success("📄 Level 1: References extracted and saved in references_json folder.")
         
         # Level 1: Calling to download all the PDFs
-        download_papers_from_dois("./references_json", "./downloaded_papers")
+        download_papers_from_dois(references_folder, download_folder)
         st.success("📄 Level 1: Papers downloaded using extracted DOIs and saved in downloaded_papers folder.")
 
         # Level 1: Copy downloaded papers to Collected_Papers
-        copy_files("./downloaded_papers", "./Collected_Papers")
+        copy_files(download_folder, target_folder)
         st.success("📂 Level 1: Extracted Papers successfully moved to Collected_Papers(root) folder.")
 
         # Initialize and build the knowledge graph
-        if "kg" not in st.session_state:
-            st.session_state.kg = KnowledgeGraph(target_folder, RELATED_PAPERS_FOLDER)
+        related_papers_folder = os.path.join(workspace, "related_papers")
+        os.makedirs(related_papers_folder, exist_ok=True)
+        if st.session_state.get("kg_workspace") != workspace:
+            st.session_state.kg = KnowledgeGraph(target_folder, related_papers_folder,
+                                                 os.path.join(workspace, "kg_store"), references_folder)
             st.session_state.kg.build_graph()
+            st.session_state.kg_workspace = workspace
 
         
         # Query the knowledge graph
@@ -163,6 +196,9 @@ if "search_results" in st.session_state:
         query_test = st.text_input("Enter your research query:", value=st.session_state.get("query_test", ""))
         if st.button("Search Related Papers"):
             st.session_state.query_test = query_test  # Store user input persistently
+            # Only this query's hits are summarised, so clear the papers copied for the previous one
+            shutil.rmtree(related_papers_folder, ignore_errors=True)
+            os.makedirs(related_papers_folder, exist_ok=True)
             st.session_state.related_papers = st.session_state.kg.query_papers(query_test, top_k=5)
             st.success("📄 Top related papers displayed below.")
 
@@ -170,23 +206,24 @@ if "search_results" in st.session_state:
                 st.write(f"{paper} - Similarity Score: {score:.4f}")
                 
             # Summarize all the papers
-            process_all_pdfs_in_folder("./related_papers")
+            process_all_pdfs_in_folder(related_papers_folder)
             st.success("📄 Papers summarized and saved in summary folder.")
 
-            # Generate Literature Review
-            Writer_agent.generate_literature_review()
-            st.success("📄 Literature review generated and saved in the root folder.")
-
-            # Display the generated literature review in Streamlit
-            output_file = "generated_literature_review.txt"
-            if os.path.exists(output_file):
-                with open(output_file, "r", encoding="utf-8") as file:
-                    literature_review_content = file.read()
-                
-                st.subheader("📜 Generated Literature Review")
-                st.markdown(literature_review_content, unsafe_allow_html=True)  # Display formatted text
+            # Generate the literature review, rendering it in Streamlit as it is written
+            st.subheader("📜 Generated Literature Review")
+            review_placeholder = st.empty()
+            literature_review_content = ""
+            try:
+                for piece in Writer_agent.generate_literature_review_stream():
+                    literature_review_content += piece
+                    review_placeholder.markdown(literature_review_content, unsafe_allow_html=True)  # Display formatted text
+            except Exception as e:
+                st.error(f"❌ Literature review generation failed: {e}")
             else:
-                st.error("❌ Literature review file not found. Please check the generation process.")
+                if os.path.exists(Writer_agent.OUTPUT_FILE) and literature_review_content:
+                    st.success("📄 Literature review generated and saved in the root folder.")
+                else:
+                    st.error("❌ Literature review file not found. Please check the generation process.")
         
                 
 
@@ -1,4 +1,4 @@
-from test import KnowledgeGraph
+from Knowledge_Graph import KnowledgeGraph
 
 # Define folders
 PDF_FOLDER = "./Collected_Papers"
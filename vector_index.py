@@ -0,0 +1,115 @@
+import numpy as np
+
+# Above this many vectors the index switches to approximate (IVF) search by default
+ANN_THRESHOLD = 50_000
+# Rows assigned to IVF lists per block, so a float16 or memory-mapped matrix is never upcast whole
+ASSIGN_BLOCK_ROWS = 65_536
+
+def normalize_rows(vectors):
+    """Returns the vectors as a contiguous float32 matrix with unit-length rows."""
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_indices(scores, k):
+    """Returns the column indices of the k highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means on unit vectors; returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+class VectorIndex:
+    """
+    Cosine-similarity index over one contiguous, L2-normalized float32 matrix.
+    Exact search is a single matmul plus argpartition top-k and accepts a batch of
+    queries at once. For large corpora an IVF index (k-means coarse quantizer)
+    restricts each query to the vectors of its n_probe closest clusters.
+    """
+
+    def __init__(self, dim=None, use_ann=None, n_probe=8):
+        self.dim = dim
+        self.keys = []
+        self.matrix = np.empty((0, dim or 0), dtype=np.float32)
+        self.use_ann = use_ann
+        self.n_probe = n_probe
+        self._centroids = None
+        self._lists = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def build(self, keys, vectors, normalized=False):
+        """Replaces the index content with the given keys and vectors.
+        Pass normalized=True for unit-length float32 rows (e.g. a memory-mapped matrix) to use them without a copy."""
+        self.keys = list(keys)
+        if not self.keys:
+            self.matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+        elif normalized:
+            self.matrix = vectors
+        else:
+            self.matrix = normalize_rows(vectors)
+        self.dim = self.matrix.shape[1]
+        self._centroids = self._lists = None
+        if self._ann_enabled():
+            self._train_ivf()
+
+    def add(self, keys, vectors):
+        """Appends vectors to the index."""
+        if not len(self.keys):
+            return self.build(keys, vectors)
+        self.build(self.keys + list(keys), np.vstack([self.matrix, normalize_rows(vectors)]))
+
+    def _ann_enabled(self):
+        return self.use_ann if self.use_ann is not None else len(self.keys) > ANN_THRESHOLD
+
+    def _train_ivf(self):
+        """Clusters the matrix into ~sqrt(n) inverted lists."""
+        n_lists = max(1, int(np.sqrt(len(self.keys))))
+        rng = np.random.default_rng(0)
+        sample = self.matrix[rng.choice(len(self.keys), min(len(self.keys), n_lists * 64), replace=False)]
+        self._centroids, _ = kmeans(normalize_rows(sample), n_lists)
+        assignments = np.concatenate([
+            np.argmax(np.asarray(self.matrix[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32) @ self._centroids.T, axis=1)
+            for start in range(0, len(self.keys), ASSIGN_BLOCK_ROWS)
+        ])
+        self._lists = [np.flatnonzero(assignments == c) for c in range(len(self._centroids))]
+
+    def search(self, queries, top_k=5):
+        """Returns, for each query vector, a list of (key, score) pairs, best first."""
+        queries = normalize_rows(queries)
+        if not len(self.keys):
+            return [[] for _ in range(len(queries))]
+
+        if self._lists is None:
+            scores = queries @ self.matrix.T
+            indices = top_k_indices(scores, top_k)
+            return [
+                [(self.keys[i], float(scores[row, i])) for i in indices[row]]
+                for row in range(len(queries))
+            ]
+
+        results = []
+        probes = top_k_indices(queries @ self._centroids.T, self.n_probe)
+        for query, clusters in zip(queries, probes):
+            candidates = np.concatenate([self._lists[c] for c in clusters])
+            scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+            best = top_k_indices(scores[None, :], top_k)[0]
+            results.append([(self.keys[candidates[i]], float(scores[i])) for i in best])
+        return results